@@ -0,0 +1,219 @@
+"""
+Alert Correlation Engine
+Groups raw SOC alerts by (MITRE technique, source entity) in sliding time
+windows and keeps a bounded set of consolidated incidents.
+"""
+
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+
+IP_RE = re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}\b')
+HOST_RE = re.compile(r'\b(?:host|server|endpoint|agent)-\d+\b', re.IGNORECASE)
+
+
+def extract_entity(message, item=None):
+    """Best-effort source entity: Wazuh srcip/agent, else an IP or host in the text."""
+    if item:
+        srcip = (item.get('data') or {}).get('srcip')
+        if srcip:
+            return srcip
+        agent = (item.get('agent') or {}).get('name')
+        if agent:
+            return agent
+    match = IP_RE.search(message) or HOST_RE.search(message)
+    return match.group(0).lower() if match else 'unknown'
+
+
+def parse_timestamp(value, default=None):
+    """ISO-8601 (incl. Wazuh's +0000 offsets) → epoch seconds."""
+    try:
+        text = value.replace('Z', '+00:00')
+        if re.search(r'[+-]\d{4}$', text):
+            text = text[:-2] + ':' + text[-2:]
+        dt = datetime.fromisoformat(text)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except (AttributeError, ValueError):
+        return time.time() if default is None else default
+
+
+def _iso(ts):
+    return datetime.utcfromtimestamp(ts).isoformat()
+
+
+class AlertCorrelator:
+    """
+    Streaming alert → incident correlation.
+
+    Alerts with the same key whose timestamps fall within `window_seconds`
+    of an open incident are folded into it (count, severity, time span).
+    Incidents idle past `retention_seconds` expire, and at most
+    `max_incidents` are kept. Alert ids already seen are skipped, so
+    re-polling an overlapping Wazuh window does not inflate counts.
+    """
+
+    def __init__(self, window_seconds=300, retention_seconds=3 * 3600,
+                 max_incidents=2000, max_seen_alerts=20000, sample_size=5):
+        self.window_seconds = window_seconds
+        self.retention_seconds = retention_seconds
+        self.max_incidents = max_incidents
+        self.max_seen_alerts = max_seen_alerts
+        self.sample_size = sample_size
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._open = {}                  # key → live incidents for that key, newest last
+        self._incidents = OrderedDict()  # incident id → incident, least recently updated first
+        self._expiry = []                # heap of (last_seen, incident id); stale entries skipped
+        self._seen = OrderedDict()       # alert fingerprint → None
+        self.stats = {'alerts_in': 0, 'duplicates': 0, 'incidents_created': 0, 'expired': 0}
+
+    @staticmethod
+    def key_for(alert):
+        mitre_id = alert.get('mitre_id') or 'N/A'
+        # Unmapped alerts would all share 'N/A'; group them by message instead
+        signature = mitre_id if mitre_id != 'N/A' else alert.get('message', '')
+        return signature, alert.get('source_entity') or extract_entity(alert.get('message', ''))
+
+    def ingest(self, alerts, now=None):
+        """Fold a batch of alerts in; return the incidents that changed."""
+        now = time.time() if now is None else now
+        changed = {}
+        with self._lock:
+            for alert in alerts:
+                incident = self._ingest_one(alert, now)
+                if incident:
+                    changed[incident['id']] = incident
+            self._expire(now)
+            return [self._public(i) for i in changed.values() if i['id'] in self._incidents]
+
+    def _ingest_one(self, alert, now):
+        self.stats['alerts_in'] += 1
+        fingerprint = (alert.get('id'), alert.get('timestamp'), alert.get('message'))
+        if fingerprint in self._seen:
+            self.stats['duplicates'] += 1
+            return None
+        self._seen[fingerprint] = None
+        if len(self._seen) > self.max_seen_alerts:
+            self._seen.popitem(last=False)
+
+        ts = parse_timestamp(alert.get('timestamp'), now)
+        key = self.key_for(alert)
+        severity = alert.get('severity', 'low')
+        incident = self._match(key, ts)
+
+        if incident is None:
+            incident = {
+                'id': f"inc-{next(self._ids):06d}",
+                'key': key,
+                'mitre_id': alert.get('mitre_id', 'N/A'),
+                'mitre_name': alert.get('mitre_name', 'Unknown'),
+                'mitre_tactic': alert.get('mitre_tactic', 'Unknown'),
+                'source_entity': key[1],
+                'severity': severity,
+                'message': alert.get('message', ''),
+                'count': 0,
+                'first_seen': ts,
+                'last_seen': ts,
+                'sources': set(),
+                'alert_ids': [],
+            }
+            self._open.setdefault(key, []).append(incident)
+            self.stats['incidents_created'] += 1
+
+        incident['count'] += 1
+        incident['first_seen'] = min(incident['first_seen'], ts)
+        if ts >= incident['last_seen']:
+            incident['last_seen'] = ts
+            incident['message'] = alert.get('message', incident['message'])
+            self._open[key].sort(key=lambda i: i['last_seen'])
+            heapq.heappush(self._expiry, (ts, incident['id']))
+        if SEVERITY_RANK.get(severity, 0) > SEVERITY_RANK.get(incident['severity'], 0):
+            incident['severity'] = severity
+        incident['sources'].add(alert.get('source', 'unknown'))
+        if len(incident['alert_ids']) < self.sample_size:
+            incident['alert_ids'].append(alert.get('id'))
+
+        self._incidents[incident['id']] = incident
+        self._incidents.move_to_end(incident['id'])
+        return incident
+
+    def _match(self, key, ts):
+        """Live incident for `key` whose window covers `ts` (newest first)."""
+        for incident in reversed(self._open.get(key, ())):
+            if (incident['first_seen'] - self.window_seconds <= ts
+                    <= incident['last_seen'] + self.window_seconds):
+                return incident
+        return None
+
+    def _expire(self, now):
+        """
+        Drop incidents whose `last_seen` is older than the retention window
+        (by timestamp, so a backfilled alert cannot shield stale incidents),
+        then the least recently updated ones beyond `max_incidents`.
+        """
+        cutoff = now - self.retention_seconds
+        while self._expiry and self._expiry[0][0] < cutoff:
+            last_seen, incident_id = heapq.heappop(self._expiry)
+            incident = self._incidents.get(incident_id)
+            if incident is not None and incident['last_seen'] == last_seen:
+                self._drop(incident)
+
+        while len(self._incidents) > self.max_incidents:
+            self._drop(next(iter(self._incidents.values())))
+
+        # Superseded heap entries accumulate as incidents advance; rebuild occasionally
+        if len(self._expiry) > 4 * len(self._incidents) + 64:
+            self._expiry = [(i['last_seen'], i['id']) for i in self._incidents.values()]
+            heapq.heapify(self._expiry)
+
+    def _drop(self, incident):
+        del self._incidents[incident['id']]
+        live = [i for i in self._open.get(incident['key'], ()) if i is not incident]
+        if live:
+            self._open[incident['key']] = live
+        else:
+            self._open.pop(incident['key'], None)
+        self.stats['expired'] += 1
+
+    @staticmethod
+    def _public(incident):
+        return {
+            'id': incident['id'],
+            'mitre_id': incident['mitre_id'],
+            'mitre_name': incident['mitre_name'],
+            'mitre_tactic': incident['mitre_tactic'],
+            'source_entity': incident['source_entity'],
+            'severity': incident['severity'],
+            'message': incident['message'],
+            'count': incident['count'],
+            'first_seen': _iso(incident['first_seen']),
+            'last_seen': _iso(incident['last_seen']),
+            # alert-compatible fields so incidents can go straight to analysis
+            'timestamp': _iso(incident['last_seen']),
+            'sources': sorted(incident['sources']),
+            'alert_ids': list(incident['alert_ids']),
+        }
+
+    def incidents(self, limit=100, min_severity=None, now=None):
+        """Most recently active incidents first."""
+        now = time.time() if now is None else now
+        floor = SEVERITY_RANK.get(min_severity, 0)
+        with self._lock:
+            self._expire(now)
+            ordered = sorted(self._incidents.values(), key=lambda i: i['last_seen'], reverse=True)
+            return [self._public(i) for i in ordered
+                    if SEVERITY_RANK.get(i['severity'], 0) >= floor][:limit]
+
+    def snapshot_stats(self):
+        with self._lock:
+            return {**self.stats, 'open_incidents': len(self._incidents),
+                    'tracked_alerts': len(self._seen)}
@@ -0,0 +1,132 @@
+"""
+Startup Benchmark
+Measures module import time, app-factory cold start and time to first
+response, each in a fresh interpreter, and compares against a saved
+baseline.
+
+Timings are normalised by a reference probe (importing the framework
+stack alone) run alongside each sample, so the baseline carries over
+between machines and noisy runs: a regression means web_scada got slower
+relative to Flask/SQLAlchemy on the same box.
+
+Run with:
+    python bench_startup.py            # print results
+    python bench_startup.py --save     # record as the new baseline
+    python bench_startup.py --check    # exit 1 on a normalised regression vs baseline
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(HERE, 'startup_benchmark.json')
+REGRESSION_TOLERANCE = 1.25
+# Normalised increases smaller than this (in reference units) are noise
+REGRESSION_MIN_DELTA = 0.05
+
+# Framework imports only; the yardstick other timings are divided by
+REFERENCE_PROBE = r'''
+import json, time
+t0 = time.perf_counter()
+import flask, flask_socketio, flask_sqlalchemy, sqlalchemy
+print(json.dumps({'reference_ms': (time.perf_counter() - t0) * 1000}))
+'''
+
+# Each probe runs in a clean interpreter and prints {metric: milliseconds}
+PROBE = r'''
+import json, os, sys, time
+t0 = time.perf_counter()
+import web_scada
+t1 = time.perf_counter()
+app = web_scada.create_app({
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(sys.argv[1], 'bench.db'),
+    'STATE_DIR': os.path.join(sys.argv[1], 'state'),
+    'SCADA_SERVICES': (),
+})
+t2 = time.perf_counter()
+client = app.test_client()
+client.get('/api/state')
+t3 = time.perf_counter()
+with app.app_context():
+    web_scada.init_db()
+t4 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'first_response_ms': (t3 - t2) * 1000,
+    'cold_start_ms': (t3 - t0) * 1000,
+    'db_seed_ms': (t4 - t3) * 1000,
+}))
+'''
+
+
+def run_probe(probe):
+    with tempfile.TemporaryDirectory() as tmp:
+        out = subprocess.run(
+            [sys.executable, '-c', probe, tmp],
+            cwd=HERE, capture_output=True, text=True, check=True,
+        ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure(runs):
+    """Median milliseconds and median reference-normalised ratios over `runs` pairs."""
+    samples = []
+    for _ in range(runs):
+        reference = run_probe(REFERENCE_PROBE)['reference_ms']
+        sample = run_probe(PROBE)
+        samples.append((reference, sample))
+    keys = list(samples[0][1])
+    return {
+        'reference_ms': round(statistics.median(r for r, _ in samples), 1),
+        'metrics_ms': {k: round(statistics.median(s[k] for _, s in samples), 1) for k in keys},
+        'normalized': {k: round(statistics.median(s[k] / r for r, s in samples), 3) for k in keys},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--save', action='store_true', help='write results as the baseline')
+    parser.add_argument('--check', action='store_true', help='fail on regression vs baseline')
+    args = parser.parse_args()
+
+    results = measure(args.runs)
+    baseline = None
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f).get('normalized')
+
+    print(f"⏱️  Startup benchmark (median of {args.runs} runs, "
+          f"reference import {results['reference_ms']:.1f} ms)")
+    regressions = []
+    for key, value in results['metrics_ms'].items():
+        norm = results['normalized'][key]
+        line = f"   {key:<18} {value:>8.1f} ms   {norm:>6.3f} x ref"
+        if baseline and key in baseline:
+            ratio = norm / baseline[key] if baseline[key] else 1.0
+            line += f"   (baseline {baseline[key]:.3f} x ref, x{ratio:.2f})"
+            # db_seed is dominated by password hashing, not startup work
+            if (key != 'db_seed_ms' and ratio > REGRESSION_TOLERANCE
+                    and norm - baseline[key] > REGRESSION_MIN_DELTA):
+                regressions.append(key)
+        print(line)
+
+    if args.save:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f"💾 Baseline saved to {BASELINE_PATH}")
+
+    if args.check and regressions:
+        print(f"❌ Startup regression in: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""
+Control Command Pipeline
+Queues area switching commands, batches them into single MQTT publishes,
+tracks them in flight until the hardware echo confirms them, retries on
+timeout and records round-trip latency.
+"""
+
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+CONTROL_AREAS = ('area1', 'area2')
+CONTROL_VALUES = ('ON', 'OFF')
+
+# Marks our own publishes so the broker loop-back is not mistaken for the ESP32
+CONTROL_SOURCE = 'scada'
+
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        for i, bound in enumerate(self.buckets):
+            if ms <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def quantile(self, q):
+        """Upper bucket bound containing quantile `q` (None when empty)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return round(self.max, 1)
+
+    def snapshot(self):
+        labels = [f"<={b}" for b in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 1) if self.count else None,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'max_ms': round(self.max, 1),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class Command:
+    __slots__ = ('id', 'areas', 'username', 'action', 'origin', 'status', 'batch_id',
+                 'attempts', 'created_at', 'sent_at', 'delivered_at', 'acked_at')
+
+    def __init__(self, command_id, areas, username, action='SET_AREAS', origin=None):
+        self.id = command_id
+        self.areas = areas
+        self.username = username
+        self.action = action
+        self.origin = origin    # opaque caller context handed back to `audit`
+        self.status = 'queued'
+        self.batch_id = None
+        self.attempts = 0
+        self.created_at = time.time()
+        self.sent_at = None
+        self.delivered_at = None
+        self.acked_at = None
+
+    def to_dict(self):
+        def ms(t):
+            return round((t - self.created_at) * 1000, 1) if t else None
+        return {
+            'command_id': self.id,
+            'areas': self.areas,
+            'status': self.status,
+            'batch_id': self.batch_id,
+            'attempts': self.attempts,
+            'username': self.username,
+            'queued_ms': ms(self.sent_at),
+            'delivered_ms': ms(self.delivered_at),
+            'acked_ms': ms(self.acked_at),
+        }
+
+
+class CommandPipeline:
+    """
+    Command ids, in-flight table and echo correlation for `grid/control`.
+
+    Lifecycle: queued → sent → delivered (broker echoed our publish) →
+    acked (hardware echoed the new area state). Batches not delivered in
+    time are republished up to `max_retries`; delivered batches without a
+    hardware ack end up `unconfirmed`. When MQTT is offline commands are
+    applied to the digital twin directly (`local`).
+
+    `audit(commands)`, if given, is called from the worker once per batch,
+    so audit writes never sit on the submitting request thread.
+    """
+
+    def __init__(self, publish, apply_local, is_online, audit=None, batch_window=0.05,
+                 delivery_timeout=2.0, ack_timeout=5.0, max_retries=2, history=500):
+        self.publish = publish
+        self.apply_local = apply_local
+        self.is_online = is_online
+        self.audit = audit
+        self.batch_window = batch_window
+        self.delivery_timeout = delivery_timeout
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.history = history
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._commands = OrderedDict()   # command id → Command (bounded history)
+        self._in_flight = OrderedDict()  # batch id → {'commands', 'areas', 'sent_at', 'attempts'}
+        self._worker = None
+
+        self.delivery_latency = LatencyHistogram()
+        self.ack_latency = LatencyHistogram()
+        self.counters = {'submitted': 0, 'batches': 0, 'retries': 0, 'acked': 0,
+                         'unconfirmed': 0, 'failed': 0, 'local': 0}
+
+    # ── Submission (request threads) ────────────────────────
+    def submit(self, areas, username=None, action='SET_AREAS', origin=None):
+        """Queue {area: 'ON'|'OFF'}; raises ValueError for anything else."""
+        if not isinstance(areas, dict) or not areas:
+            raise ValueError("areas must be a non-empty object")
+        for area, value in areas.items():
+            if area not in CONTROL_AREAS or value not in CONTROL_VALUES:
+                raise ValueError(f"invalid control: {area}={value}")
+        with self._lock:
+            cmd = self._register(dict(areas), username, action, origin)
+        return self._enqueue(cmd)
+
+    def submit_toggle(self, area, current, username=None, origin=None):
+        """
+        Flip `area` relative to the latest pending command for it, or to
+        `current(area)` when nothing is pending. Resolution and registration
+        happen under one lock, so concurrent toggles alternate.
+        """
+        if area not in CONTROL_AREAS:
+            raise ValueError(f"invalid control area: {area}")
+        with self._lock:
+            value = self._pending_value(area)
+            if value is None:
+                value = current(area)
+            areas = {area: 'OFF' if value == 'ON' else 'ON'}
+            cmd = self._register(areas, username, f"TOGGLE_{area.upper()}", origin)
+        return self._enqueue(cmd)
+
+    def _register(self, areas, username, action, origin):
+        cmd = Command(f"cmd-{next(self._ids):06d}", areas, username, action, origin)
+        self._commands[cmd.id] = cmd
+        while len(self._commands) > self.history:
+            self._commands.popitem(last=False)
+        self.counters['submitted'] += 1
+        return cmd
+
+    def _enqueue(self, cmd):
+        self._ensure_worker()
+        self._queue.put(cmd)
+        return cmd
+
+    def pending_value(self, area):
+        """Latest value queued or in flight for `area` (None if nothing pending)."""
+        with self._lock:
+            return self._pending_value(area)
+
+    def _pending_value(self, area):
+        for cmd in reversed(self._commands.values()):
+            if cmd.status in ('queued', 'sent', 'delivered') and area in cmd.areas:
+                return cmd.areas[area]
+        return None
+
+    def get(self, command_id):
+        with self._lock:
+            cmd = self._commands.get(command_id)
+            return cmd.to_dict() if cmd else None
+
+    # ── Worker ──────────────────────────────────────────────
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='control-pipeline', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=0.25)
+            except queue.Empty:
+                self._check_timeouts()
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._dispatch(batch)
+            self._audit(batch)
+            self._check_timeouts()
+
+    def _audit(self, commands):
+        if self.audit is None:
+            return
+        try:
+            self.audit(commands)
+        except Exception as e:
+            print(f"⚠️ Control audit failed for {len(commands)} command(s): {e}")
+
+    def _dispatch(self, commands):
+        areas = {}
+        for cmd in commands:
+            areas.update(cmd.areas)   # later commands win per area
+
+        if not self.is_online():
+            self.apply_local(areas)
+            with self._lock:
+                for cmd in commands:
+                    cmd.status = 'local'
+                self.counters['local'] += len(commands)
+            return
+
+        batch_id = f"b-{commands[0].id[4:]}"
+        entry = {'commands': commands, 'areas': areas, 'sent_at': 0.0, 'attempts': 0,
+                 'delivered': False}
+        with self._lock:
+            self._in_flight[batch_id] = entry
+            for cmd in commands:
+                cmd.batch_id = batch_id
+            self.counters['batches'] += 1
+        self._send(batch_id, entry)
+
+    def _send(self, batch_id, entry):
+        now = time.time()
+        with self._lock:
+            entry['sent_at'] = now
+            entry['attempts'] += 1
+            for cmd in entry['commands']:
+                cmd.status = 'sent'
+                cmd.attempts = entry['attempts']
+                cmd.sent_at = cmd.sent_at or now
+        self.publish({**entry['areas'], 'cmd_id': batch_id, 'src': CONTROL_SOURCE})
+
+    def _check_timeouts(self):
+        now = time.time()
+        retry = []
+        with self._lock:
+            for batch_id, entry in list(self._in_flight.items()):
+                age = now - entry['sent_at']
+                if not entry['delivered'] and age > self.delivery_timeout:
+                    if entry['attempts'] <= self.max_retries:
+                        retry.append((batch_id, entry))
+                        self.counters['retries'] += 1
+                    else:
+                        self._finish(batch_id, 'failed')
+                elif entry['delivered'] and age > self.ack_timeout:
+                    self._finish(batch_id, 'unconfirmed')
+        for batch_id, entry in retry:
+            self._send(batch_id, entry)
+
+    def _finish(self, batch_id, status, now=None):
+        entry = self._in_flight.pop(batch_id)
+        for cmd in entry['commands']:
+            cmd.status = status
+            if status == 'acked':
+                cmd.acked_at = now
+                self.ack_latency.observe((now - cmd.created_at) * 1000)
+        self.counters[status] += len(entry['commands'])
+
+    # ── Echo correlation (MQTT thread) ──────────────────────
+    def on_echo(self, data):
+        """Correlate a `grid/control` message with the in-flight table."""
+        now = time.time()
+        batch_id = data.get('cmd_id')
+        with self._lock:
+            if batch_id and data.get('src') == CONTROL_SOURCE:
+                entry = self._in_flight.get(batch_id)
+                if entry and not entry['delivered']:
+                    entry['delivered'] = True
+                    for cmd in entry['commands']:
+                        cmd.status = 'delivered'
+                        cmd.delivered_at = now
+                        self.delivery_latency.observe((now - cmd.created_at) * 1000)
+                return batch_id if entry else None
+
+            if batch_id not in self._in_flight:
+                # Hardware echo without our id: oldest batch whose areas it reports
+                batch_id = next((
+                    bid for bid, entry in self._in_flight.items()
+                    if all(data.get(area) == value for area, value in entry['areas'].items())
+                ), None)
+            if batch_id:
+                self._finish(batch_id, 'acked', now)
+            return batch_id
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._in_flight),
+                'queued': self._queue.qsize(),
+                'counters': dict(self.counters),
+                'delivery_latency': self.delivery_latency.snapshot(),
+                'ack_latency': self.ack_latency.snapshot(),
+            }
@@ -0,0 +1,258 @@
+"""
+Energy Accounting & Time-of-Use Billing
+Trapezoidal integration of power over real timestamps per meter, priced
+against a time-of-use tariff, with running totals kept incrementally and
+a NumPy path for billing historical periods in bulk.
+"""
+
+import json
+import math
+import threading
+import time
+from datetime import datetime
+
+from load_profile import NUMPY_AVAILABLE
+
+# (start hour, end hour, band); hours not covered fall back to 'standard'
+DEFAULT_TARIFF = {
+    'rates': {'off_peak': 0.15, 'standard': 0.25, 'peak': 0.35},
+    'periods': [
+        {'start': 0, 'end': 7, 'band': 'off_peak'},
+        {'start': 17, 'end': 22, 'band': 'peak'},
+    ],
+}
+
+DEFAULT_BAND = 'standard'
+METERS = ('total', 'area1', 'area2')
+
+# Share of the feeder load drawn by each area while it is energized
+AREA_LOAD_SHARE = {'area1': 0.5, 'area2': 0.5}
+
+
+class TariffSchedule:
+    """Time-of-use tariff compiled into a per-minute band table."""
+
+    def __init__(self, rates, periods):
+        self.bands = sorted(rates)
+        if DEFAULT_BAND not in self.bands:
+            raise ValueError(f"tariff needs a '{DEFAULT_BAND}' rate")
+        self.rates = dict(rates)
+        band_index = {band: i for i, band in enumerate(self.bands)}
+        table = [band_index[DEFAULT_BAND]] * 1440
+        for period in periods:
+            start = int(period['start'] * 60)
+            end = int(period['end'] * 60)
+            minutes = range(start, end) if start <= end else list(range(start, 1440)) + list(range(0, end))
+            for minute in minutes:
+                table[minute] = band_index[period['band']]
+        self._band_table = table
+        self._band_array = None
+        self.rate_array = None
+
+    @classmethod
+    def from_dict(cls, doc):
+        return cls(doc['rates'], doc.get('periods', []))
+
+    @classmethod
+    def load(cls, path=None):
+        """Load a tariff file, falling back to the built-in schedule."""
+        if path:
+            try:
+                with open(path) as f:
+                    tariff = cls.from_dict(json.load(f))
+                print(f"💲 Tariff loaded from {path}")
+                return tariff
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Tariff {path} unusable ({e}), using default schedule")
+        return cls.from_dict(DEFAULT_TARIFF)
+
+    def band_at(self, ts):
+        local = datetime.fromtimestamp(ts)
+        return self.bands[self._band_table[local.hour * 60 + local.minute]]
+
+    def rate_at(self, ts):
+        return self.rates[self.band_at(ts)]
+
+    def band_indices(self, timestamps, utc_offset):
+        """Vectorized band lookup (NumPy arrays built on first use)."""
+        import numpy as np
+
+        if self._band_array is None:
+            self._band_array = np.asarray(self._band_table, dtype=np.int64)
+            self.rate_array = np.asarray([self.rates[b] for b in self.bands])
+        minutes = (((timestamps + utc_offset) % 86400) // 60).astype(np.int64)
+        return self._band_array[minutes]
+
+    def to_dict(self):
+        return {'rates': self.rates, 'bands': self.bands}
+
+
+def _empty_totals(bands):
+    return {'kwh': 0.0, 'cost': 0.0,
+            'bands': {band: {'kwh': 0.0, 'cost': 0.0} for band in bands}}
+
+
+class EnergyAccount:
+    """
+    Running per-meter energy and cost totals.
+
+    Each `sample()` integrates the interval since the meter's previous
+    reading with the trapezoidal rule and prices it at the band in force at
+    the interval midpoint. Intervals longer than `max_gap_seconds` (server
+    downtime, stalled telemetry) are skipped rather than extrapolated.
+    """
+
+    def __init__(self, tariff, meters=METERS, max_gap_seconds=60):
+        self.tariff = tariff
+        self.meters = meters
+        self.max_gap_seconds = max_gap_seconds
+        self._lock = threading.Lock()
+        self._last = {}
+        self.totals = {meter: _empty_totals(tariff.bands) for meter in meters}
+        self.since = time.time()
+
+    def sample(self, ts, readings):
+        """Fold {meter: watts} taken at `ts`; return the cost added to 'total'."""
+        added = 0.0
+        with self._lock:
+            for meter, power_w in readings.items():
+                prev = self._last.get(meter)
+                self._last[meter] = (ts, power_w)
+                if prev is None:
+                    continue
+                dt = ts - prev[0]
+                if dt <= 0 or dt > self.max_gap_seconds:
+                    continue
+                kwh = (prev[1] + power_w) / 2.0 * dt / 3.6e6
+                band = self.tariff.band_at(prev[0] + dt / 2.0)
+                cost = kwh * self.tariff.rates[band]
+                totals = self.totals[meter]
+                totals['kwh'] += kwh
+                totals['cost'] += cost
+                totals['bands'][band]['kwh'] += kwh
+                totals['bands'][band]['cost'] += cost
+                if meter == 'total':
+                    added = cost
+        return added
+
+    def snapshot(self):
+        with self._lock:
+            return {'since': self.since, 'totals': json.loads(json.dumps(self.totals))}
+
+    def restore(self, state):
+        """
+        Merge persisted totals into the current tariff's band layout. Bands
+        the tariff no longer has are dropped from the breakdown (the meter
+        total keeps them); new bands start at zero.
+        """
+        with self._lock:
+            self.since = state.get('since', self.since)
+            for meter, saved in (state.get('totals') or {}).items():
+                if meter not in self.totals or not isinstance(saved, dict):
+                    continue
+                totals = _empty_totals(self.tariff.bands)
+                totals['kwh'] = float(saved.get('kwh', 0.0))
+                totals['cost'] = float(saved.get('cost', 0.0))
+                for band, values in (saved.get('bands') or {}).items():
+                    if band in totals['bands'] and isinstance(values, dict):
+                        totals['bands'][band] = {'kwh': float(values.get('kwh', 0.0)),
+                                                 'cost': float(values.get('cost', 0.0))}
+                self.totals[meter] = totals
+
+
+def area_readings(load_w, areas):
+    """Split feeder load across energized areas by AREA_LOAD_SHARE."""
+    live = {a: share for a, share in AREA_LOAD_SHARE.items() if areas.get(a) == 'ON'}
+    total_share = sum(live.values())
+    readings = {'total': load_w}
+    for area in AREA_LOAD_SHARE:
+        readings[area] = load_w * live[area] / total_share if area in live else 0.0
+    return readings
+
+
+def local_offsets(timestamps):
+    """
+    Per-timestamp UTC offset (seconds) of the server's zone, DST-aware.
+
+    The zone is probed once per hour of the range; each hour whose offset
+    changes is bisected to the exact transition second.
+    """
+    import numpy as np
+
+    t = np.asarray(timestamps, dtype=np.float64)
+    if t.size == 0:
+        return t
+    start = math.floor(t.min() / 3600) * 3600
+    grid = np.arange(start, t.max() + 3600, 3600)
+    offsets = np.array([time.localtime(g).tm_gmtoff for g in grid], dtype=np.float64)
+    changes = np.nonzero(np.diff(offsets))[0]
+    if not changes.size:
+        return np.full(t.shape, offsets[0])
+
+    transitions = []
+    for i in changes:
+        lo, hi = int(grid[i]), int(grid[i + 1])
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if time.localtime(mid).tm_gmtoff == offsets[i]:
+                lo = mid
+            else:
+                hi = mid
+        transitions.append(hi)
+    values = np.concatenate(([offsets[0]], offsets[changes + 1]))
+    return values[np.searchsorted(transitions, t, side='right')]
+
+
+def bill_period(timestamps, power_w, tariff, max_gap_seconds=300, utc_offset=None):
+    """
+    Bill a historical series in bulk.
+
+    `timestamps` (epoch seconds, ascending) and `power_w` are parallel
+    sequences. Returns energy and cost in total and per tariff band.
+    Bands are looked up in the server's local time with per-interval DST
+    offsets (matching `EnergyAccount.sample`), unless a fixed `utc_offset`
+    is given.
+    """
+    if not NUMPY_AVAILABLE:
+        totals = _empty_totals(tariff.bands)
+        samples = 0
+        for i in range(1, len(timestamps)):
+            dt = timestamps[i] - timestamps[i - 1]
+            if dt <= 0 or dt > max_gap_seconds:
+                continue
+            kwh = (power_w[i - 1] + power_w[i]) / 2.0 * dt / 3.6e6
+            band = tariff.band_at(timestamps[i - 1] + dt / 2.0)
+            totals['kwh'] += kwh
+            totals['cost'] += kwh * tariff.rates[band]
+            totals['bands'][band]['kwh'] += kwh
+            totals['bands'][band]['cost'] += kwh * tariff.rates[band]
+            samples += 1
+        totals['intervals'] = samples
+        return totals
+
+    import numpy as np
+
+    t = np.asarray(timestamps, dtype=np.float64)
+    p = np.asarray(power_w, dtype=np.float64)
+    if t.size < 2:
+        return {**_empty_totals(tariff.bands), 'intervals': 0}
+
+    dt = np.diff(t)
+    valid = (dt > 0) & (dt <= max_gap_seconds)
+    kwh = np.where(valid, (p[:-1] + p[1:]) * 0.5 * dt / 3.6e6, 0.0)
+    midpoints = t[:-1] + dt * 0.5
+    if utc_offset is None:
+        utc_offset = local_offsets(midpoints)
+    bands = tariff.band_indices(midpoints, utc_offset)
+    cost = kwh * tariff.rate_array[bands]
+
+    n = len(tariff.bands)
+    band_kwh = np.bincount(bands, weights=kwh, minlength=n)
+    band_cost = np.bincount(bands, weights=cost, minlength=n)
+    return {
+        'kwh': float(kwh.sum()),
+        'cost': float(cost.sum()),
+        'bands': {band: {'kwh': float(band_kwh[i]), 'cost': float(band_cost[i])}
+                  for i, band in enumerate(tariff.bands)},
+        'intervals': int(valid.sum()),
+    }
@@ -0,0 +1,197 @@
+"""
+Load / Generation Forecasting
+Seasonal-naive baseline (the compiled load profile) corrected by EWMA
+residuals learned incrementally from observed telemetry.
+"""
+
+import math
+import threading
+import time
+from datetime import datetime
+
+from load_profile import DEFAULT_FEEDER, NUMPY_AVAILABLE
+
+DEFAULT_HORIZONS_HOURS = (1, 3, 6, 12)
+
+
+class LoadForecaster:
+    """
+    Incremental load/generation forecaster.
+
+    Each observation updates, in O(1):
+      - the running mean residual of the current slot; when the slot ends
+        that mean is folded into a per-slot-of-day EWMA (what the profile
+        gets wrong at this time of day), so `slot_alpha` weighs days, not
+        samples,
+      - a short-term level EWMA (current deviation beyond that), which
+        decays towards zero over the forecast horizon,
+      - an EWMA of the generation/load ratio (transmission losses).
+
+    Forecasts are rebuilt by `refit()` on a schedule and cached per
+    horizon, so serving one never touches history.
+    """
+
+    def __init__(self, profile, feeder=DEFAULT_FEEDER, slot_minutes=15,
+                 step_minutes=5, horizons=DEFAULT_HORIZONS_HOURS,
+                 refit_interval=60, slot_alpha=0.1, level_alpha=0.3,
+                 level_half_life_hours=1.0):
+        self.profile = profile
+        self.feeder = feeder
+        self.slot_minutes = slot_minutes
+        self.step_minutes = step_minutes
+        self.horizons = tuple(sorted(horizons))
+        self.refit_interval = refit_interval
+        self.slot_alpha = slot_alpha
+        self.level_alpha = level_alpha
+        self.level_half_life_hours = level_half_life_hours
+
+        slots = 24 * 60 // slot_minutes
+        self._slot_residual = [0.0] * slots
+        self._slot_seen = [False] * slots
+        self._open_slot = None    # (date ordinal, slot) being accumulated
+        self._open_sum = 0.0
+        self._open_count = 0
+        self._level = 0.0
+        self._variance = 0.0
+        self._gen_ratio = 1.055
+        self._last_ts = 0.0
+        self.observations = 0
+
+        self._lock = threading.Lock()
+        self._cache = {}
+        self.fitted_at = 0.0
+
+    # ── Incremental fitting ─────────────────────────────────
+    def _slot_index(self, local_dt):
+        return (local_dt.hour * 60 + local_dt.minute) // self.slot_minutes
+
+    def observe(self, ts, load_w, gen_w=None):
+        """Fold one telemetry sample (epoch seconds, watts) into the model."""
+        local = datetime.fromtimestamp(ts)
+        baseline = self.profile.evaluate_at(local, self.feeder)
+        residual = load_w - baseline
+        slot = self._slot_index(local)
+
+        with self._lock:
+            key = (local.toordinal(), slot)
+            if key != self._open_slot:
+                self._fold_open_slot()
+                self._open_slot = key
+            self._open_sum += residual
+            self._open_count += 1
+
+            seasonal = self._seasonal_residual(slot)
+            error = residual - seasonal - self._level
+            self._variance += self.level_alpha * (error * error - self._variance)
+            self._level += self.level_alpha * (residual - seasonal - self._level)
+
+            if gen_w and load_w > 0:
+                self._gen_ratio += self.slot_alpha * (gen_w / load_w - self._gen_ratio)
+
+            self._last_ts = max(self._last_ts, ts)
+            self.observations += 1
+
+    def _fold_open_slot(self):
+        """Fold the finished slot's mean residual into its EWMA (once per slot per day)."""
+        if self._open_slot is None or not self._open_count:
+            return
+        slot = self._open_slot[1]
+        mean = self._open_sum / self._open_count
+        if self._slot_seen[slot]:
+            self._slot_residual[slot] += self.slot_alpha * (mean - self._slot_residual[slot])
+        else:
+            self._slot_residual[slot] = mean
+            self._slot_seen[slot] = True
+        self._open_slot = None
+        self._open_sum = 0.0
+        self._open_count = 0
+
+    def _seasonal_residual(self, slot):
+        """Slot EWMA, or the open slot's running mean the first time a slot is seen."""
+        if self._slot_seen[slot]:
+            return self._slot_residual[slot]
+        if self._open_slot is not None and self._open_slot[1] == slot and self._open_count:
+            return self._open_sum / self._open_count
+        return 0.0
+
+    def warm_start(self, samples):
+        """Replay (ts, load_w, gen_w) samples, oldest first."""
+        for ts, load_w, gen_w in samples:
+            self.observe(ts, load_w, gen_w)
+
+    # ── Scheduled refit ─────────────────────────────────────
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        return now - self.fitted_at >= self.refit_interval
+
+    def refit(self, now=None):
+        """Rebuild the cached forecast for every horizon."""
+        now = time.time() if now is None else now
+        with self._lock:
+            slot_residual = [self._seasonal_residual(i) for i in range(len(self._slot_residual))]
+            level = self._level
+            sigma = math.sqrt(max(self._variance, 0.0))
+            gen_ratio = self._gen_ratio
+
+        step = self.step_minutes * 60
+        steps = int(self.horizons[-1] * 3600 // step)
+        start = now - now % step + step
+        timestamps = [start + k * step for k in range(steps)]
+        decay_rate = math.log(2) / (self.level_half_life_hours * 3600)
+        utc_offset = time.localtime(now).tm_gmtoff
+
+        baseline = self.profile.evaluate_many(timestamps, self.feeder, utc_offset)
+        slot_seconds = self.slot_minutes * 60
+        if NUMPY_AVAILABLE:
+            import numpy as np
+
+            ts = np.asarray(timestamps, dtype=np.float64)
+            slots = (((ts + utc_offset) % 86400) // slot_seconds).astype(np.int64)
+            ahead = ts - now
+            load = (np.asarray(baseline) + np.asarray(slot_residual)[slots]
+                    + level * np.exp(-decay_rate * ahead))
+            load = np.clip(load, 0, None)
+            band = 1.96 * sigma * np.sqrt(1 + ahead / 3600.0)
+            rows = zip(timestamps, load.tolist(), band.tolist())
+        else:
+            rows = []
+            for ts, base in zip(timestamps, baseline):
+                ahead = ts - now
+                slot = int(((ts + utc_offset) % 86400) // slot_seconds)
+                value = base + slot_residual[slot] + level * math.exp(-decay_rate * ahead)
+                rows.append((ts, max(0.0, value), 1.96 * sigma * math.sqrt(1 + ahead / 3600.0)))
+
+        points = [{
+            'timestamp': datetime.utcfromtimestamp(ts).isoformat(),
+            'load_mw': round(value, 1),
+            'gen_mw': round(value * gen_ratio, 1),
+            'load_lower': round(max(0.0, value - band), 1),
+            'load_upper': round(value + band, 1),
+        } for ts, value, band in rows]
+
+        generated_at = datetime.utcfromtimestamp(now).isoformat()
+        cache = {}
+        for horizon in self.horizons:
+            n = int(horizon * 3600 // step)
+            cache[horizon] = {
+                'horizon_hours': horizon,
+                'step_minutes': self.step_minutes,
+                'generated_at': generated_at,
+                'observations': self.observations,
+                'model': 'seasonal_naive+ewma',
+                'points': points[:n],
+            }
+        self._cache = cache
+        self.fitted_at = now
+        return cache
+
+    # ── Serving ─────────────────────────────────────────────
+    def horizon_for(self, hours):
+        """Smallest cached horizon covering `hours`."""
+        for horizon in self.horizons:
+            if hours <= horizon:
+                return horizon
+        return self.horizons[-1]
+
+    def forecast(self, hours):
+        return self._cache.get(self.horizon_for(hours))
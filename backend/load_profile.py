@@ -0,0 +1,232 @@
+"""
+Load Profile Model
+Daily demand curves (per feeder / season / day type) compiled once into
+dense lookup tables for O(1) scalar and vectorized evaluation.
+"""
+
+import importlib.util
+import json
+import time
+from datetime import datetime, timezone
+
+# NumPy is imported on first vectorized call to keep server import time low
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
+# ─────────────────────────────────────────────────────────────
+# Defaults
+# ─────────────────────────────────────────────────────────────
+DEFAULT_RESOLUTION_MINUTES = 1
+DEFAULT_FEEDER = 'default'
+WILDCARD = '*'
+
+# Piecewise linear anchor points (hour, watts) for a typical day
+DEFAULT_ANCHORS = [
+    (0, 2000), (6, 2000),      # night: low
+    (7, 2800), (9, 3800),      # morning ramp
+    (12, 4000),                # late morning
+    (13, 5500), (17, 5500),    # afternoon plateau
+    (18, 6500), (20, 8000),    # evening peak ramp
+    (21, 8000),                # peak
+    (22, 5500), (23, 3500),    # evening wind-down
+    (24, 2000),                # back to night
+]
+
+SEASONS = ('winter', 'spring', 'summer', 'autumn')
+DAY_TYPES = ('weekday', 'weekend')
+DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# month (1-12) → season index
+_MONTH_SEASON = [0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0]
+
+
+def season_for_month(month):
+    return SEASONS[_MONTH_SEASON[month]]
+
+
+def day_type_for_weekday(weekday):
+    return 'weekend' if weekday >= 5 else 'weekday'
+
+
+def _day_fallbacks(day):
+    """Day lookup chain: 'sat' → 'weekend' → '*'."""
+    if day in DAY_NAMES:
+        return day, day_type_for_weekday(DAY_NAMES.index(day)), WILDCARD
+    return (day, WILDCARD) if day != WILDCARD else (WILDCARD,)
+
+
+def _compile_anchors(anchors, slots_per_hour):
+    """
+    Expand (hour, watts) anchors into a dense table with one entry per slot
+    plus a closing entry at 24:00 so interpolation never wraps.
+    """
+    points = sorted((float(h), float(v)) for h, v in anchors)
+    if not points:
+        raise ValueError("load curve needs at least one anchor point")
+    if points[0][0] > 0:
+        points.insert(0, (0.0, points[-1][1]))
+    if points[-1][0] < 24:
+        points.append((24.0, points[0][1]))
+
+    slots = 24 * slots_per_hour
+    table = []
+    seg = 0
+    for i in range(slots + 1):
+        hour = i / slots_per_hour
+        while seg < len(points) - 2 and hour > points[seg + 1][0]:
+            seg += 1
+        t0, v0 = points[seg]
+        t1, v1 = points[seg + 1]
+        if t1 == t0:
+            table.append(v0)
+        else:
+            table.append(v0 + (hour - t0) / (t1 - t0) * (v1 - v0))
+    return table
+
+
+class LoadProfile:
+    """
+    Compiled set of daily load curves.
+
+    Curves are keyed by (feeder, season, day_type); any part may be '*'.
+    `day_type` is a weekday name ('mon'..'sun') or 'weekday'/'weekend'.
+    Lookups fall back from the most specific key (day → day type → '*',
+    then season → '*') to the wildcard curve of the feeder and finally to
+    the default feeder.
+    """
+
+    def __init__(self, curves, resolution_minutes=DEFAULT_RESOLUTION_MINUTES):
+        if 60 % resolution_minutes:
+            raise ValueError("resolution_minutes must divide 60")
+        self.resolution_minutes = resolution_minutes
+        self.slots_per_hour = 60 // resolution_minutes
+        self._tables = {}
+        for curve in curves:
+            key = (
+                curve.get('feeder', DEFAULT_FEEDER),
+                curve.get('season', WILDCARD),
+                curve.get('day_type', WILDCARD),
+            )
+            if key[1] not in (WILDCARD, *SEASONS):
+                raise ValueError(f"unknown season: {key[1]}")
+            if key[2] not in (WILDCARD, *DAY_TYPES, *DAY_NAMES):
+                raise ValueError(f"unknown day_type: {key[2]}")
+            self._tables[key] = _compile_anchors(curve['anchors'], self.slots_per_hour)
+        # Every lookup must end somewhere: keep the built-in curve as the
+        # default feeder's wildcard unless the profile supplies its own
+        if (DEFAULT_FEEDER, WILDCARD, WILDCARD) not in self._tables:
+            self._tables[(DEFAULT_FEEDER, WILDCARD, WILDCARD)] = _compile_anchors(
+                DEFAULT_ANCHORS, self.slots_per_hour)
+        self._resolved = {}
+        self._matrices = {}
+
+    # ── Construction ────────────────────────────────────────
+    @classmethod
+    def default(cls):
+        return cls([{'anchors': DEFAULT_ANCHORS}])
+
+    @classmethod
+    def from_dict(cls, doc):
+        return cls(doc.get('curves', []),
+                   doc.get('resolution_minutes', DEFAULT_RESOLUTION_MINUTES))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def load(cls, path=None):
+        """Load a profile file, falling back to the built-in curve."""
+        if path:
+            try:
+                profile = cls.from_file(path)
+                print(f"📈 Load profile loaded from {path}")
+                return profile
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Load profile {path} unusable ({e}), using default curve")
+        return cls.default()
+
+    @property
+    def feeders(self):
+        return sorted({k[0] for k in self._tables})
+
+    # ── Lookup ──────────────────────────────────────────────
+    def table_for(self, feeder=DEFAULT_FEEDER, season=WILDCARD, day_type=WILDCARD):
+        key = (feeder, season, day_type)
+        table = self._resolved.get(key)
+        if table is None:
+            days = _day_fallbacks(day_type)
+            seasons = (season, WILDCARD) if season != WILDCARD else (WILDCARD,)
+            for f in (feeder, DEFAULT_FEEDER):
+                for candidate in ((f, s, d) for s in seasons for d in days):
+                    table = self._tables.get(candidate)
+                    if table is not None:
+                        break
+                if table is not None:
+                    break
+            self._resolved[key] = table
+        return table
+
+    def evaluate(self, hour, feeder=DEFAULT_FEEDER, season=WILDCARD, day_type=WILDCARD):
+        """Return load (W) at fractional hour-of-day."""
+        table = self.table_for(feeder, season, day_type)
+        pos = (hour % 24) * self.slots_per_hour
+        i = int(pos)
+        v0 = table[i]
+        return v0 + (pos - i) * (table[i + 1] - v0)
+
+    def evaluate_at(self, when, feeder=DEFAULT_FEEDER):
+        """Return load (W) for a local datetime, honouring season and weekday."""
+        hour = when.hour + when.minute / 60.0 + (when.second + when.microsecond / 1e6) / 3600.0
+        return self.evaluate(hour, feeder,
+                             season_for_month(when.month),
+                             DAY_NAMES[when.weekday()])
+
+    # ── Vectorized evaluation ───────────────────────────────
+    def _matrix(self, feeder):
+        """Stack the resolved tables for every season/weekday combination."""
+        matrix = self._matrices.get(feeder)
+        if matrix is None:
+            import numpy as np
+            matrix = np.array([
+                self.table_for(feeder, season, day)
+                for season in SEASONS for day in DAY_NAMES
+            ], dtype=np.float64)
+            self._matrices[feeder] = matrix
+        return matrix
+
+    def evaluate_many(self, timestamps, feeder=DEFAULT_FEEDER, utc_offset=None):
+        """
+        Evaluate the profile for an array of timestamps.
+
+        `timestamps` are epoch seconds (or numpy datetime64). `utc_offset`
+        shifts them to local time in seconds; defaults to the server's
+        current offset.
+        """
+        if utc_offset is None:
+            utc_offset = time.localtime().tm_gmtoff
+
+        if not NUMPY_AVAILABLE:
+            return [self.evaluate_at(datetime.fromtimestamp(float(ts) + utc_offset, timezone.utc), feeder)
+                    for ts in timestamps]
+
+        import numpy as np
+
+        ts = np.asarray(timestamps)
+        if ts.dtype.kind == 'M':
+            ts = ts.astype('datetime64[ms]').astype(np.int64) / 1000.0
+        local = ts.astype(np.float64) + utc_offset
+
+        days = np.floor(local / 86400.0)
+        weekday = (days.astype(np.int64) + 3) % 7          # 1970-01-01 was a Thursday (mon=0)
+        month = local.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64) % 12 + 1
+        season = np.asarray(_MONTH_SEASON)[month]
+        row = season * len(DAY_NAMES) + weekday
+
+        pos = (local - days * 86400.0) * (self.slots_per_hour / 3600.0)
+        i = np.minimum(pos.astype(np.int64), 24 * self.slots_per_hour - 1)
+        frac = pos - i
+
+        matrix = self._matrix(feeder)
+        v0 = matrix[row, i]
+        return v0 + frac * (matrix[row, i + 1] - v0)
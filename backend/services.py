@@ -0,0 +1,110 @@
+"""
+Background Service Registry
+Independently enabled subsystems (simulator, MQTT bridge, Wazuh poller,
+DB seeding, ...) with start/stop lifecycle hooks, started lazily on first
+use or explicitly from the entry point.
+"""
+
+import threading
+import time
+
+
+# Failed starts are retried by start_all() after 1, 2, 4 ... seconds, capped here
+MAX_RETRY_BACKOFF_SECONDS = 60
+
+
+class Service:
+    __slots__ = ('name', 'start_fn', 'stop_fn', 'enabled', 'running', 'started_ms', 'error',
+                 'failures', 'retry_at')
+
+    def __init__(self, name, start, stop=None, enabled=True):
+        self.name = name
+        self.start_fn = start
+        self.stop_fn = stop
+        self.enabled = enabled
+        self.running = False
+        self.started_ms = None
+        self.error = None
+        self.failures = 0
+        self.retry_at = 0.0
+
+
+class ServiceRegistry:
+    """
+    Ordered set of services. `start_all()` is idempotent and cheap once
+    everything is up, so it can sit on the request path; a service that
+    fails to start is retried on later calls with exponential backoff.
+    `stop_all()` runs the stop hooks in reverse start order.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._services = {}
+        self._lock = threading.RLock()
+        self._all_started = False
+
+    def register(self, name, start, stop=None, enabled=True):
+        self._services[name] = Service(name, start, stop, enabled)
+        self._all_started = False
+
+    def start(self, name):
+        with self._lock:
+            service = self._services[name]
+            if service.running:
+                return True
+            began = time.perf_counter()
+            try:
+                with self.app.app_context():
+                    service.start_fn(self.app)
+            except Exception as e:
+                service.error = str(e)
+                service.failures += 1
+                backoff = min(MAX_RETRY_BACKOFF_SECONDS, 2 ** (service.failures - 1))
+                service.retry_at = time.monotonic() + backoff
+                print(f"⚠️ Service '{name}' failed to start: {e} (retry in {backoff}s)")
+                return False
+            service.running = True
+            service.error = None
+            service.failures = 0
+            service.started_ms = round((time.perf_counter() - began) * 1000, 1)
+            return True
+
+    def start_all(self):
+        if self._all_started:
+            return
+        with self._lock:
+            if self._all_started:
+                return
+            now = time.monotonic()
+            for name, service in self._services.items():
+                if service.enabled and not service.running and now >= service.retry_at:
+                    self.start(name)
+            self._all_started = all(s.running for s in self._services.values() if s.enabled)
+
+    def stop(self, name):
+        with self._lock:
+            service = self._services[name]
+            if not service.running:
+                return
+            if service.stop_fn:
+                try:
+                    with self.app.app_context():
+                        service.stop_fn(self.app)
+                except Exception as e:
+                    print(f"⚠️ Service '{name}' failed to stop cleanly: {e}")
+            service.running = False
+            self._all_started = False
+
+    def stop_all(self):
+        with self._lock:
+            for name in reversed(list(self._services)):
+                self.stop(name)
+
+    def is_running(self, name):
+        service = self._services.get(name)
+        return bool(service and service.running)
+
+    def status(self):
+        return {name: {'enabled': s.enabled, 'running': s.running,
+                       'started_ms': s.started_ms, 'error': s.error, 'failures': s.failures}
+                for name, s in self._services.items()}
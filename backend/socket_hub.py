@@ -0,0 +1,188 @@
+"""
+Socket.IO Subscription Hub
+Per-channel rooms with rate-limit tiers, so each broadcast is serialized
+once per room and only reaches sockets that asked for it.
+"""
+
+import threading
+import time
+
+from flask_socketio import join_room, leave_room
+
+from state_codec import FORMAT_JSON, pre_encode, supported_formats
+
+CHANNELS = ('telemetry', 'security', 'alerts')
+DEVICES = ('plant', 'meter', 'area1', 'area2')
+DEVICE_PREFIX = 'device:'
+
+# Allowed per-subscription rate limits (Hz); None = every update
+RATE_TIERS_HZ = (10, 2, 1, 0.5, 0.2, 0.1)
+
+
+def is_valid_channel(channel):
+    if not isinstance(channel, str):
+        return False
+    if channel in CHANNELS:
+        return True
+    return channel.startswith(DEVICE_PREFIX) and channel[len(DEVICE_PREFIX):] in DEVICES
+
+
+def snap_rate(max_hz):
+    """Round a requested rate down to the nearest tier (None = unlimited)."""
+    if not max_hz:
+        return None
+    if isinstance(max_hz, bool):
+        raise ValueError(f"invalid max_hz: {max_hz!r}")
+    try:
+        max_hz = float(max_hz)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid max_hz: {max_hz!r}") from None
+    if not max_hz > 0:
+        raise ValueError(f"invalid max_hz: {max_hz!r}")
+    for tier in RATE_TIERS_HZ:
+        if max_hz >= tier:
+            return tier
+    return RATE_TIERS_HZ[-1]
+
+
+def room_name(channel, rate_hz=None, fmt=FORMAT_JSON):
+    room = channel if rate_hz is None else f"{channel}@{rate_hz:g}hz"
+    return room if fmt == FORMAT_JSON else f"{room}#{fmt}"
+
+
+class SocketHub:
+    """Tracks which socket is in which (channel, rate, format) room and fans out to them."""
+
+    def __init__(self, socketio, namespace='/'):
+        self.socketio = socketio
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._rooms = {}    # room → {'channel', 'format', 'interval', 'members', 'last_emit', 'pending', 'timer'}
+        self._by_sid = {}   # sid → {channel: room}
+
+    # ── Membership ──────────────────────────────────────────
+    def subscribe(self, sid, channel, max_hz=None, fmt=FORMAT_JSON):
+        if not is_valid_channel(channel):
+            raise ValueError(f"unknown channel: {channel!r}")
+        if not isinstance(fmt, str) or fmt not in supported_formats():
+            raise ValueError(f"unsupported format: {fmt!r}")
+        rate = snap_rate(max_hz)
+        room = room_name(channel, rate, fmt)
+
+        with self._lock:
+            previous = self._by_sid.setdefault(sid, {}).get(channel)
+            if previous == room:
+                return room
+            if previous:
+                self._leave(sid, previous)
+            info = self._rooms.setdefault(room, {
+                'channel': channel,
+                'format': fmt,
+                'interval': 1.0 / rate if rate else 0.0,
+                'members': set(),
+                'last_emit': 0.0,
+                'pending': {},    # event → latest throttled payload
+                'timer': None,    # trailing emit for `pending`
+            })
+            info['members'].add(sid)
+            self._by_sid[sid][channel] = room
+        join_room(room, sid=sid, namespace=self.namespace)
+        return room
+
+    def subscribe_request(self, sid, data):
+        """Subscribe from a client payload: {'channel', 'max_hz'?, 'format'?}."""
+        if not isinstance(data, dict):
+            raise ValueError("subscription must be an object")
+        return self.subscribe(sid, data.get('channel'), data.get('max_hz'),
+                              data.get('format', FORMAT_JSON))
+
+    def unsubscribe(self, sid, channel):
+        with self._lock:
+            room = self._by_sid.get(sid, {}).pop(channel, None)
+            if room:
+                self._leave(sid, room)
+        if room:
+            leave_room(room, sid=sid, namespace=self.namespace)
+        return room
+
+    def drop(self, sid):
+        """Forget a disconnected socket (Socket.IO clears its rooms itself)."""
+        with self._lock:
+            for room in self._by_sid.pop(sid, {}).values():
+                self._leave(sid, room)
+
+    def _leave(self, sid, room):
+        info = self._rooms.get(room)
+        if info:
+            info['members'].discard(sid)
+            if not info['members']:
+                if info['timer']:
+                    info['timer'].cancel()
+                del self._rooms[room]
+
+    def subscriptions(self, sid):
+        with self._lock:
+            return dict(self._by_sid.get(sid, {}))
+
+    def format_for(self, sid, channel):
+        with self._lock:
+            room = self._by_sid.get(sid, {}).get(channel)
+            return self._rooms[room]['format'] if room else FORMAT_JSON
+
+    # ── Fan-out ─────────────────────────────────────────────
+    def publish(self, channel, event, payload, throttle=True):
+        """
+        Emit `event` to every room of `channel` that is due.
+
+        Rooms without members are skipped entirely. Throttled rooms keep
+        only the latest skipped payload per event and send it once their
+        interval elapses, so the last update is never lost. The payload is
+        encoded at most once per wire format.
+        """
+        payload = pre_encode(payload)
+        now = time.monotonic()
+        targets = []
+        with self._lock:
+            for room, info in self._rooms.items():
+                if info['channel'] != channel:
+                    continue
+                if throttle and now - info['last_emit'] < info['interval']:
+                    info['pending'][event] = payload
+                    if info['timer'] is None:
+                        delay = info['interval'] - (now - info['last_emit'])
+                        info['timer'] = threading.Timer(delay, self._flush, args=(room,))
+                        info['timer'].daemon = True
+                        info['timer'].start()
+                    continue
+                info['last_emit'] = now
+                info['pending'].pop(event, None)
+                targets.append((room, info['format']))
+
+        for room, fmt in targets:
+            self._emit(room, fmt, event, payload)
+        return len(targets)
+
+    def _flush(self, room):
+        """Trailing emit: send what a throttled room skipped during its interval."""
+        with self._lock:
+            info = self._rooms.get(room)
+            if info is None:
+                return
+            info['timer'] = None
+            pending, info['pending'] = info['pending'], {}
+            if pending:
+                info['last_emit'] = time.monotonic()
+            fmt = info['format']
+        for event, payload in pending.items():
+            self._emit(room, fmt, event, payload)
+
+    def _emit(self, room, fmt, event, payload):
+        data = payload if fmt == FORMAT_JSON else payload.encoded(fmt)
+        self.socketio.emit(event, data, to=room, namespace=self.namespace)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': len(self._by_sid),
+                'rooms': {room: len(info['members']) for room, info in self._rooms.items()},
+            }
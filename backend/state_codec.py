@@ -0,0 +1,129 @@
+"""
+State Encoding Layer
+Serializes each state snapshot once (orjson when available, MessagePack
+on request) and lets REST responses and Socket.IO broadcasts reuse the
+cached bytes.
+"""
+
+import json
+import threading
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+FORMAT_JSON = 'json'
+FORMAT_MSGPACK = 'msgpack'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+
+def _default(obj):
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    """Encode to compact UTF-8 JSON bytes."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':'), default=_default).encode()
+
+
+def packb(obj):
+    if not MSGPACK_AVAILABLE:
+        raise RuntimeError("msgpack not installed")
+    return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+def supported_formats():
+    return (FORMAT_JSON, FORMAT_MSGPACK) if MSGPACK_AVAILABLE else (FORMAT_JSON,)
+
+
+class PreEncoded:
+    """A payload plus its lazily built, cached encodings."""
+
+    __slots__ = ('data', 'version', '_json', '_msgpack')
+
+    def __init__(self, data, version=0):
+        self.data = data
+        self.version = version
+        self._json = None
+        self._msgpack = None
+
+    @property
+    def json_bytes(self):
+        if self._json is None:
+            self._json = dumps_bytes(self.data)
+        return self._json
+
+    @property
+    def msgpack_bytes(self):
+        if self._msgpack is None:
+            self._msgpack = packb(self.data)
+        return self._msgpack
+
+    def encoded(self, fmt):
+        return self.msgpack_bytes if fmt == FORMAT_MSGPACK else self.json_bytes
+
+
+def pre_encode(payload):
+    return payload if isinstance(payload, PreEncoded) else PreEncoded(payload)
+
+
+class SnapshotCache:
+    """
+    Hands out one PreEncoded per distinct snapshot.
+
+    Snapshots are flat dicts of primitives, so their item tuple is an exact
+    version key; an unchanged state is never re-encoded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._current = None
+        self.version = 0
+
+    def get(self, snapshot):
+        key = tuple(snapshot.items())
+        with self._lock:
+            if key != self._key:
+                self.version += 1
+                self._key = key
+                self._current = PreEncoded(snapshot, self.version)
+            return self._current
+
+
+class SocketJSON:
+    """
+    JSON module for python-socketio that splices PreEncoded payloads into
+    the packet verbatim instead of encoding them again.
+    """
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        if isinstance(obj, PreEncoded):
+            return obj.json_bytes.decode()
+        if isinstance(obj, list) and any(isinstance(o, PreEncoded) for o in obj):
+            return '[' + ','.join(
+                o.json_bytes.decode() if isinstance(o, PreEncoded) else dumps_bytes(o).decode()
+                for o in obj
+            ) + ']'
+        return dumps_bytes(obj).decode()
+
+    @staticmethod
+    def loads(s, **kwargs):
+        if ORJSON_AVAILABLE:
+            return orjson.loads(s)
+        return json.loads(s)
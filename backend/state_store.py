@@ -0,0 +1,210 @@
+"""
+Runtime State Persistence
+Periodic compact binary snapshots plus an append-only journal of changes,
+written by a background thread so the simulation/MQTT paths never block
+on disk.
+"""
+
+import os
+import struct
+import threading
+import time
+import zlib
+
+from state_codec import MSGPACK_AVAILABLE, SocketJSON, dumps_bytes, packb
+
+if MSGPACK_AVAILABLE:
+    import msgpack
+
+SNAPSHOT_MAGIC = b'SGS1'
+JOURNAL_MAGIC = b'SGJ1'
+FMT_JSON = 0
+FMT_MSGPACK = 1
+
+# magic, format, seq, payload length, crc32
+SNAPSHOT_HEADER = struct.Struct('<4sBQII')
+# magic, format, base seq
+JOURNAL_HEADER = struct.Struct('<4sBQ')
+# payload length, crc32
+RECORD_HEADER = struct.Struct('<II')
+
+
+def _encode(obj, fmt):
+    return packb(obj) if fmt == FMT_MSGPACK else dumps_bytes(obj)
+
+
+def _decode(data, fmt):
+    if fmt == FMT_MSGPACK:
+        return msgpack.unpackb(data, raw=False)
+    return SocketJSON.loads(data)
+
+
+def _flatten(state):
+    return {(section, key): value
+            for section, values in state.items() for key, value in values.items()}
+
+
+class StateStore:
+    """
+    Snapshot + journal store for small in-memory state sections.
+
+    `capture()` returns {section: {key: value}}; `apply(state)` merges such
+    a dict back. The writer thread polls `capture()` every
+    `flush_interval`, appends only the changed keys to the journal, and
+    rolls a fresh snapshot every `snapshot_interval` (which truncates the
+    journal). `stop()` writes a final snapshot, so a clean restart restores
+    the exact state; a crash loses at most one flush interval.
+    """
+
+    def __init__(self, directory, capture, apply, flush_interval=0.25,
+                 snapshot_interval=60, fsync_interval=1.0):
+        self.directory = directory
+        self.capture = capture
+        self.apply = apply
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self.fsync_interval = fsync_interval
+        self.fmt = FMT_MSGPACK if MSGPACK_AVAILABLE else FMT_JSON
+
+        self.snapshot_path = os.path.join(directory, 'state.snapshot')
+        self.journal_path = os.path.join(directory, 'state.journal')
+
+        self._seq = 0
+        self._last = {}
+        self._journal = None
+        self._last_snapshot = 0.0
+        self._last_fsync = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'snapshots': 0, 'records': 0, 'restored_records': 0, 'restore_ms': None}
+
+    # ── Restore ─────────────────────────────────────────────
+    def restore(self):
+        """Load snapshot + journal into memory. Returns True if anything was restored."""
+        started = time.perf_counter()
+        state = {}
+        seq = 0
+
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                header = f.read(SNAPSHOT_HEADER.size)
+                magic, fmt, seq, length, crc = SNAPSHOT_HEADER.unpack(header)
+                payload = f.read(length)
+                if magic != SNAPSHOT_MAGIC or len(payload) != length or zlib.crc32(payload) != crc:
+                    raise ValueError("corrupt snapshot")
+                state = _decode(payload, fmt)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠️ State snapshot unreadable ({e}), starting from journal only")
+            state, seq = {}, 0
+
+        replayed = 0
+        try:
+            with open(self.journal_path, 'rb') as f:
+                magic, fmt, _ = JOURNAL_HEADER.unpack(f.read(JOURNAL_HEADER.size))
+                if magic != JOURNAL_MAGIC:
+                    raise ValueError("bad journal header")
+                while True:
+                    header = f.read(RECORD_HEADER.size)
+                    if len(header) < RECORD_HEADER.size:
+                        break
+                    length, crc = RECORD_HEADER.unpack(header)
+                    payload = f.read(length)
+                    if len(payload) < length or zlib.crc32(payload) != crc:
+                        break   # torn tail from a crash mid-write
+                    record = _decode(payload, fmt)
+                    if record['seq'] <= seq:
+                        continue
+                    for section, changes in record['changes'].items():
+                        state.setdefault(section, {}).update(changes)
+                    seq = record['seq']
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, struct.error) as e:
+            print(f"⚠️ State journal unreadable ({e}), using snapshot only")
+
+        self._seq = seq
+        if state:
+            self.apply(state)
+        self.stats['restored_records'] = replayed
+        self.stats['restore_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return bool(state)
+
+    # ── Writer ──────────────────────────────────────────────
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._snapshot()   # also discards any torn journal tail
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='state-store', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Flush pending changes and write a final snapshot."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        self._snapshot()
+        with self._lock:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self._flush()
+                if time.time() - self._last_snapshot >= self.snapshot_interval:
+                    self._snapshot()
+            except Exception as e:
+                print(f"⚠️ State store write failed: {e}")
+
+    def _flush(self):
+        current = _flatten(self.capture())
+        changed = {k: v for k, v in current.items() if self._last.get(k, object()) != v}
+        if not changed:
+            return
+
+        changes = {}
+        for (section, key), value in changed.items():
+            changes.setdefault(section, {})[key] = value
+
+        with self._lock:
+            self._seq += 1
+            payload = _encode({'seq': self._seq, 'ts': time.time(), 'changes': changes}, self.fmt)
+            self._journal.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._journal.flush()
+            now = time.time()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._journal.fileno())
+                self._last_fsync = now
+            self._last.update(changed)
+            self.stats['records'] += 1
+
+    def _snapshot(self):
+        state = self.capture()
+        with self._lock:
+            payload = _encode(state, self.fmt)
+            tmp = self.snapshot_path + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, self.fmt, self._seq,
+                                             len(payload), zlib.crc32(payload)))
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+
+            # Start a fresh journal based on this snapshot
+            if self._journal:
+                self._journal.close()
+            self._journal = open(self.journal_path, 'wb')
+            self._journal.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, self.fmt, self._seq))
+            self._journal.flush()
+
+            self._last = _flatten(state)
+            self._last_snapshot = time.time()
+            self.stats['snapshots'] += 1
@@ -0,0 +1,137 @@
+"""
+Static Frontend Assets
+Indexes the built `dist` tree once into a manifest and serves it with
+precompressed variants, content negotiation and cache-friendly headers.
+"""
+
+import gzip
+import mimetypes
+import os
+import re
+
+from flask import Response, request, send_file
+
+# Files up to this size are held in memory
+MEMORY_LIMIT_BYTES = 64 * 1024
+
+# Vite emits content-hashed files like assets/index-B3xk9a_Q.js
+HASHED_ASSET_RE = re.compile(r'(^|/)assets/.+-[A-Za-z0-9_-]{8,}\.[a-z0-9]+$')
+
+CACHE_IMMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_REVALIDATE = 'no-cache'
+CACHE_DEFAULT = 'public, max-age=3600'
+
+COMPRESSIBLE_PREFIXES = ('text/', 'application/javascript', 'application/json',
+                         'image/svg+xml', 'application/manifest+json')
+
+# Preferred order when a client accepts several encodings
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class Asset:
+    __slots__ = ('path', 'file', 'size', 'mimetype', 'etag', 'cache_control',
+                 'data', 'variants')
+
+    def __init__(self, path, file, size, mtime, mimetype, cache_control):
+        self.path = path
+        self.file = file
+        self.size = size
+        self.mimetype = mimetype
+        self.etag = f"{size:x}-{int(mtime):x}"
+        self.cache_control = cache_control
+        self.data = None
+        self.variants = {}   # encoding → (file or None, bytes or None)
+
+
+class StaticAssets:
+    """Manifest of the frontend build, built once and served from memory where possible."""
+
+    def __init__(self, root, index='index.html', memory_limit=MEMORY_LIMIT_BYTES):
+        self.root = root
+        self.index = index
+        self.memory_limit = memory_limit
+        self.manifest = {}
+        self.build()
+
+    def build(self):
+        manifest = {}
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                names = set(filenames)
+                for name in filenames:
+                    if name.endswith(('.gz', '.br')):
+                        continue
+                    file = os.path.join(dirpath, name)
+                    rel = os.path.relpath(file, self.root).replace(os.sep, '/')
+                    manifest[rel] = self._index_file(rel, file, names, name)
+        self.manifest = manifest
+        return manifest
+
+    def _index_file(self, rel, file, names, name):
+        stat = os.stat(file)
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if rel == self.index:
+            cache_control = CACHE_REVALIDATE
+        elif HASHED_ASSET_RE.search(rel):
+            cache_control = CACHE_IMMUTABLE
+        else:
+            cache_control = CACHE_DEFAULT
+        asset = Asset(rel, file, stat.st_size, stat.st_mtime, mimetype, cache_control)
+
+        if stat.st_size <= self.memory_limit:
+            with open(file, 'rb') as f:
+                asset.data = f.read()
+
+        for encoding, suffix in ENCODINGS:
+            if name + suffix in names:
+                variant = file + suffix
+                data = None
+                if os.path.getsize(variant) <= self.memory_limit:
+                    with open(variant, 'rb') as f:
+                        data = f.read()
+                asset.variants[encoding] = (variant, data)
+
+        # Small text files without a prebuilt .gz get one compressed in memory
+        if (asset.data and 'gzip' not in asset.variants
+                and mimetype.startswith(COMPRESSIBLE_PREFIXES)):
+            compressed = gzip.compress(asset.data, compresslevel=9, mtime=0)
+            if len(compressed) < len(asset.data):
+                asset.variants['gzip'] = (None, compressed)
+        return asset
+
+    # ── Serving ─────────────────────────────────────────────
+    def lookup(self, path):
+        """Return the asset for `path`, falling back to the SPA index."""
+        return self.manifest.get(path) or self.manifest.get(self.index)
+
+    def serve(self, path):
+        asset = self.lookup(path)
+        if asset is None:
+            return Response('Frontend build not found', status=404, mimetype='text/plain')
+
+        encoding = None
+        for candidate, _ in ENCODINGS:
+            if candidate in asset.variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+
+        etag = f"{asset.etag}-{encoding}" if encoding else asset.etag
+        if encoding:
+            file, data = asset.variants[encoding]
+        else:
+            file, data = asset.file, asset.data
+
+        if data is not None:
+            response = Response(data, mimetype=asset.mimetype)
+            response.set_etag(etag)
+            response.make_conditional(request)
+        else:
+            response = send_file(file, mimetype=asset.mimetype, etag=etag,
+                                 conditional=True, max_age=None)
+
+        response.headers['Cache-Control'] = asset.cache_control
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        return response
@@ -0,0 +1,56 @@
+import copy
+import os
+import sys
+
+import pytest
+
+# Backend modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import web_scada  # noqa: E402
+
+
+def make_app(tmp_path, name='app', **config):
+    """App with no background services on its own SQLite file, tables seeded."""
+    app = web_scada.create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / (name + '.db')}",
+        'STATE_DIR': str(tmp_path / (name + '-state')),
+        'SCADA_SERVICES': (),
+        **config,
+    })
+    with app.app_context():
+        web_scada.init_db()
+    return app
+
+
+@pytest.fixture(autouse=True)
+def runtime_state():
+    """Grid state is process-wide; give every test its own copy of it."""
+    saved = (copy.deepcopy(web_scada.system_state), copy.deepcopy(web_scada.security_stats),
+             copy.deepcopy(web_scada.hardware_state))
+    yield
+    web_scada.system_state.clear()
+    web_scada.system_state.update(saved[0])
+    web_scada.security_stats.clear()
+    web_scada.security_stats.update(saved[1])
+    web_scada.hardware_state.clear()
+    web_scada.hardware_state.update(saved[2])
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path)
+    yield app
+    web_scada.get_services(app).stop_all()
+
+
+def login(client, username='admin', password='admin123'):
+    return client.post('/login', data={'username': username, 'password': password})
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    login(client)
+    return client
@@ -0,0 +1,52 @@
+import time
+from datetime import datetime, timezone
+
+from alert_correlation import AlertCorrelator
+
+
+def alert(alert_id, ts, ip='10.0.0.5'):
+    return {
+        'id': alert_id,
+        'timestamp': datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+        'message': f'SSH brute force from {ip}',
+        'mitre_id': 'T1110',
+        'severity': 'high',
+    }
+
+
+def test_old_alert_does_not_split_live_burst():
+    now = time.time()
+    correlator = AlertCorrelator(window_seconds=300)
+    correlator.ingest([alert(1, now), alert(2, now - 60), alert(3, now - 1800)], now)
+    correlator.ingest([alert(4, now + 1), alert(5, now + 2)], now + 5)
+
+    incidents = correlator.incidents(now=now + 5)
+    assert sorted(i['count'] for i in incidents) == [1, 4]
+
+
+def test_duplicates_are_not_counted_twice():
+    now = time.time()
+    correlator = AlertCorrelator()
+    batch = [alert(1, now), alert(2, now)]
+    correlator.ingest(batch, now)
+    correlator.ingest(batch, now)
+    assert correlator.incidents(now=now)[0]['count'] == 2
+    assert correlator.snapshot_stats()['duplicates'] == 2
+
+
+def test_retention_follows_last_seen_not_update_order():
+    now = time.time()
+    correlator = AlertCorrelator(retention_seconds=3600)
+    correlator.ingest([alert(1, now - 3000, '1.1.1.1')], now)
+    correlator.ingest([alert(2, now - 100, '2.2.2.2')], now)
+    correlator.ingest([alert(3, now - 3500, '3.3.3.3')], now)   # backfilled, updated last
+
+    remaining = correlator.incidents(now=now + 700)
+    assert [i['source_entity'] for i in remaining] == ['2.2.2.2']
+
+
+def test_incident_cap():
+    now = time.time()
+    correlator = AlertCorrelator(max_incidents=10)
+    correlator.ingest([alert(i, now, f'10.0.{i}.1') for i in range(50)], now)
+    assert correlator.snapshot_stats()['open_incidents'] == 10
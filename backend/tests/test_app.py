@@ -0,0 +1,122 @@
+import time
+
+import web_scada
+from conftest import login, make_app
+
+
+def test_create_app_starts_nothing_until_first_request(tmp_path):
+    app = make_app(tmp_path, SCADA_SERVICES=('state_store',))
+    services = web_scada.get_services(app)
+    assert not services.is_running('state_store')
+
+    app.test_client().get('/api/state')
+    assert services.is_running('state_store')
+    services.stop_all()
+    assert not services.is_running('state_store')
+
+
+def test_unknown_service_is_rejected(tmp_path):
+    try:
+        make_app(tmp_path, SCADA_SERVICES=('simulator', 'nope'))
+    except ValueError as e:
+        assert 'nope' in str(e)
+    else:
+        raise AssertionError('expected ValueError')
+
+
+def test_login_required(app):
+    assert app.test_client().get('/api/state').status_code == 401
+
+
+def test_state_negotiates_format_and_varies_on_accept(client):
+    response = client.get('/api/state', headers={'Accept': 'application/json'})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    assert 'Accept' in response.vary
+    assert 'load_mw' in response.get_json()
+
+
+def test_incident_limit_is_validated(client):
+    assert client.get('/api/v1/incidents?limit=abc').status_code == 400
+    response = client.get('/api/v1/incidents?limit=-5')
+    assert response.status_code == 200
+    assert isinstance(response.get_json()['incidents'], list)
+
+
+def test_control_rejects_malformed_commands(client):
+    for body in ({'action': 'set_areas', 'areas': {}},
+                 {'action': 'set_areas', 'areas': ['area1']},
+                 {'action': 'set_areas', 'areas': {'area1': 'MAYBE'}},
+                 {'action': 'explode'},
+                 [1, 2]):
+        assert client.post('/api/control', json=body).status_code == 400
+
+
+def test_control_toggle_is_audited_by_the_pipeline(app, client):
+    response = client.post('/api/control', json={'action': 'toggle_area1'})
+    assert response.status_code == 200
+    command_id = response.get_json()['command_id']
+
+    deadline = time.time() + 2
+    rows = []
+    while time.time() < deadline and not rows:
+        with app.app_context():
+            rows = web_scada.AuditLog.query.filter_by(action='TOGGLE_AREA1').all()
+        time.sleep(0.05)
+    assert rows and command_id in rows[0].details_json
+
+
+def test_user_cache_is_per_app(tmp_path):
+    first = make_app(tmp_path, 'first')
+    second = make_app(tmp_path, 'second')
+
+    with first.app_context():
+        operator = web_scada.User.query.filter_by(username='operator').first()
+        operator.role = 'admin'
+        web_scada.db.session.commit()
+        assert web_scada.user_cache().get(operator.id)['role'] == 'admin'
+
+    with second.app_context():
+        operator = web_scada.User.query.filter_by(username='operator').first()
+        assert web_scada.user_cache().get(operator.id)['role'] == 'operator'
+
+
+def test_role_change_reaches_live_session(app):
+    client = app.test_client()
+    login(client, 'operator', 'operator123')
+    assert client.get('/api/me').get_json()['role'] == 'operator'
+
+    with app.app_context():
+        operator = web_scada.User.query.filter_by(username='operator').first()
+        operator.role = 'admin'
+        web_scada.db.session.commit()
+
+    assert client.get('/api/me').get_json()['role'] == 'admin'
+
+
+def test_state_store_is_per_app(tmp_path):
+    first = make_app(tmp_path, 'first', SCADA_SERVICES=('state_store',))
+    second = make_app(tmp_path, 'second', SCADA_SERVICES=('state_store',))
+    for app in (first, second):
+        web_scada.get_services(app).start_all()
+
+    first_store = web_scada.scada_ext(first)['state_store']
+    second_store = web_scada.scada_ext(second)['state_store']
+    assert first_store is not second_store
+
+    web_scada.get_services(first).stop_all()
+    assert first_store._thread is None
+    assert second_store._thread is not None
+    web_scada.get_services(second).stop_all()
+
+
+def test_telemetry_tick_bills_without_simulator(app):
+    web_scada.hardware_state['last_message_time'] = 0
+    with web_scada.state_lock:
+        web_scada.system_state['load_mw'] = 3600.0
+        web_scada.system_state['calculated_bill'] = 0.0
+    now = time.time()
+    with app.app_context():
+        web_scada.telemetry_tick(now)
+        web_scada.telemetry_tick(now + 10)
+    assert web_scada.system_state['calculated_bill'] > 0
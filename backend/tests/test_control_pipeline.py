@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from control_pipeline import CommandPipeline
+
+
+def make_pipeline(online=False):
+    state = {'area1': 'ON', 'area2': 'ON'}
+    published, audited = [], []
+    pipeline = CommandPipeline(
+        publish=published.append,
+        apply_local=state.update,
+        is_online=lambda: online,
+        audit=audited.extend,
+    )
+    return pipeline, state, published, audited
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.parametrize('areas', [{}, [], None, {'area3': 'ON'}, {'area1': 'DIM'}])
+def test_submit_rejects_invalid_areas(areas):
+    pipeline, *_ = make_pipeline()
+    with pytest.raises(ValueError):
+        pipeline.submit(areas)
+
+
+def test_concurrent_toggles_alternate():
+    pipeline, state, _, _ = make_pipeline(online=True)
+    barrier = threading.Barrier(8)
+    results = []
+
+    def toggle():
+        barrier.wait()
+        cmd = pipeline.submit_toggle('area1', state.get)
+        results.append(cmd.areas['area1'])
+
+    threads = [threading.Thread(target=toggle) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(results) == ['OFF'] * 4 + ['ON'] * 4
+
+
+def test_offline_commands_apply_locally_and_are_audited():
+    pipeline, state, published, audited = make_pipeline(online=False)
+    cmd = pipeline.submit({'area1': 'OFF', 'area2': 'OFF'}, 'admin')
+    assert wait_for(lambda: pipeline.get(cmd.id)['status'] == 'local')
+    assert state == {'area1': 'OFF', 'area2': 'OFF'}
+    assert not published
+    assert wait_for(lambda: audited) and audited[0].id == cmd.id
+
+
+def test_batch_is_published_once_and_acked_by_echo():
+    pipeline, _, published, _ = make_pipeline(online=True)
+    first = pipeline.submit({'area1': 'OFF'})
+    second = pipeline.submit({'area2': 'OFF'})
+    assert wait_for(lambda: published)
+
+    payload = published[0]
+    assert payload['area1'] == 'OFF' and payload['area2'] == 'OFF'
+    pipeline.on_echo(payload)                                   # broker loop-back
+    pipeline.on_echo({'area1': 'OFF', 'area2': 'OFF'})          # hardware state echo
+    assert pipeline.get(first.id)['status'] == 'acked'
+    assert pipeline.get(second.id)['status'] == 'acked'
+    assert len(published) == 1
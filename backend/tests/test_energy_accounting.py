@@ -0,0 +1,65 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from energy_accounting import EnergyAccount, TariffSchedule, area_readings, bill_period
+from load_profile import NUMPY_AVAILABLE
+
+
+def test_trapezoidal_integration_and_gap_skip():
+    account = EnergyAccount(TariffSchedule.load(), meters=('total',), max_gap_seconds=60)
+    account.sample(0, {'total': 1000})
+    account.sample(30, {'total': 3000})           # 2 kW average for 30 s
+    account.sample(3600, {'total': 3000})         # gap: skipped
+    assert account.totals['total']['kwh'] == pytest.approx(2000 * 30 / 3.6e6)
+
+
+def test_area_readings_split_live_areas():
+    assert area_readings(4000, {'area1': 'ON', 'area2': 'OFF'}) == \
+        {'total': 4000, 'area1': 4000.0, 'area2': 0.0}
+
+
+def test_restore_into_changed_tariff():
+    old = EnergyAccount(TariffSchedule({'standard': 0.25, 'peak': 0.35},
+                                       [{'start': 17, 'end': 22, 'band': 'peak'}]))
+    old.sample(0, {'total': 1000})
+    old.sample(30, {'total': 1000})
+
+    new = EnergyAccount(TariffSchedule({'standard': 0.2, 'super': 0.5},
+                                       [{'start': 0, 'end': 24, 'band': 'super'}]))
+    new.restore(old.snapshot())
+    assert set(new.totals['total']['bands']) == {'standard', 'super'}
+    assert new.totals['total']['kwh'] == pytest.approx(old.totals['total']['kwh'])
+
+    now = time.time()
+    new.sample(now, {'total': 1000})
+    assert new.sample(now + 30, {'total': 1000}) > 0
+
+
+@pytest.fixture
+def london_time(monkeypatch):
+    if not hasattr(time, 'tzset'):
+        pytest.skip('time.tzset unavailable')
+    monkeypatch.setenv('TZ', 'Europe/London')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.skipif(not NUMPY_AVAILABLE, reason='numpy not installed')
+def test_bulk_bill_matches_running_totals_across_dst(london_time):
+    tariff = TariffSchedule.load()
+    start = datetime(2026, 10, 24, 12).timestamp()      # DST ends 2026-10-25 02:00
+    timestamps = [start + 30 * i for i in range(36 * 120)]
+    power = [1000 + 500 * ((i // 37) % 3) for i in range(len(timestamps))]
+
+    account = EnergyAccount(tariff, meters=('total',), max_gap_seconds=300)
+    for ts, watts in zip(timestamps, power):
+        account.sample(ts, {'total': watts})
+
+    bulk = bill_period(timestamps, power, tariff)
+    assert bulk['cost'] == pytest.approx(account.totals['total']['cost'])
+    for band, totals in bulk['bands'].items():
+        assert totals['kwh'] == pytest.approx(account.totals['total']['bands'][band]['kwh'])
@@ -0,0 +1,36 @@
+import random
+from datetime import datetime
+
+from forecasting import LoadForecaster
+from load_profile import LoadProfile
+
+
+def test_slot_residual_learns_days_not_ticks():
+    profile = LoadProfile.default()
+    forecaster = LoadForecaster(profile)
+    start = datetime(2026, 10, 1).timestamp()
+    rng = random.Random(1)
+
+    # Three days of 2 s telemetry: profile + 300 W offset + ±500 W noise
+    for k in range(0, 3 * 86400, 2):
+        ts = start + k
+        base = profile.evaluate_at(datetime.fromtimestamp(ts))
+        forecaster.observe(ts, base + 300 + rng.choice((-500, 500)))
+
+    residuals = forecaster._slot_residual
+    assert all(200 < r < 400 for r in residuals)
+
+
+def test_forecast_is_cached_per_horizon():
+    forecaster = LoadForecaster(LoadProfile.default(), refit_interval=60)
+    now = datetime(2026, 10, 1, 12).timestamp()
+    forecaster.observe(now - 2, 3000, 3150)
+    assert forecaster.due(now)
+    forecaster.refit(now)
+    assert not forecaster.due(now + 1)
+
+    one_hour = forecaster.forecast(1)
+    assert one_hour['horizon_hours'] == 1
+    assert len(one_hour['points']) == 12
+    assert forecaster.forecast(5)['horizon_hours'] == 6
+    assert all(p['load_lower'] <= p['load_mw'] <= p['load_upper'] for p in one_hour['points'])
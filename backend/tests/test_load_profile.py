@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+from load_profile import LoadProfile, NUMPY_AVAILABLE
+
+
+def flat(watts):
+    return [[0, watts], [24, watts]]
+
+
+def test_partial_default_feeder_falls_back_to_builtin_curve():
+    profile = LoadProfile.from_dict({'curves': [
+        {'season': 'summer', 'day_type': 'weekend', 'anchors': flat(1000)},
+    ]})
+    assert profile.evaluate_at(datetime(2026, 7, 4, 12)) == 1000        # summer Saturday
+    assert profile.evaluate_at(datetime(2026, 1, 5, 12)) == LoadProfile.default().evaluate(12)
+
+
+def test_weekday_fallback_chain():
+    profile = LoadProfile.from_dict({'curves': [
+        {'anchors': flat(1000)},
+        {'day_type': 'weekend', 'anchors': flat(2000)},
+        {'day_type': 'sat', 'anchors': flat(3000)},
+        {'season': 'summer', 'day_type': 'mon', 'anchors': flat(4000)},
+    ]})
+    # 2026-07-04 is a Saturday
+    days = [datetime(2026, 7, d, 12) for d in range(4, 11)]
+    assert [profile.evaluate_at(d) for d in days] == [3000, 2000, 4000, 1000, 1000, 1000, 1000]
+    assert profile.evaluate_at(datetime(2026, 1, 5, 12)) == 1000        # winter Monday
+
+
+@pytest.mark.parametrize('curve', [{'day_type': 'monday'}, {'season': 'monsoon'}])
+def test_unknown_keys_are_rejected(curve):
+    with pytest.raises(ValueError):
+        LoadProfile.from_dict({'curves': [{**curve, 'anchors': flat(1)}]})
+
+
+@pytest.mark.skipif(not NUMPY_AVAILABLE, reason='numpy not installed')
+def test_vectorized_matches_scalar():
+    profile = LoadProfile.from_dict({'curves': [
+        {'anchors': [[0, 2000], [9, 3800], [20, 8000], [24, 2000]]},
+        {'day_type': 'sun', 'anchors': [[0, 1500], [14, 6000], [24, 1500]]},
+    ]})
+    start = datetime(2026, 3, 1).timestamp()
+    timestamps = [start + k * 977.3 for k in range(2000)]
+    vector = profile.evaluate_many(timestamps)
+    for ts, value in zip(timestamps[::97], vector[::97]):
+        assert value == pytest.approx(profile.evaluate_at(datetime.fromtimestamp(ts)), abs=1e-6)
@@ -0,0 +1,40 @@
+from flask import Flask
+
+import services
+from services import ServiceRegistry
+
+
+def test_failed_service_is_retried_after_backoff(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(services.time, 'monotonic', lambda: clock[0])
+    attempts = []
+
+    def flaky(app):
+        attempts.append(clock[0])
+        if len(attempts) == 1:
+            raise RuntimeError('database is locked')
+
+    registry = ServiceRegistry(Flask(__name__))
+    registry.register('db_seed', flaky)
+    registry.start_all()
+    assert registry.status()['db_seed']['error'] == 'database is locked'
+
+    registry.start_all()                 # still backing off
+    assert len(attempts) == 1
+
+    clock[0] += 1.5
+    registry.start_all()
+    assert registry.is_running('db_seed')
+    assert registry.status()['db_seed']['failures'] == 0
+
+
+def test_disabled_services_do_not_start_and_stop_runs_in_reverse():
+    events = []
+    registry = ServiceRegistry(Flask(__name__))
+    for name in ('a', 'b', 'c'):
+        registry.register(name, lambda app, n=name: events.append(f'start {n}'),
+                          lambda app, n=name: events.append(f'stop {n}'),
+                          enabled=name != 'b')
+    registry.start_all()
+    registry.stop_all()
+    assert events == ['start a', 'start c', 'stop c', 'stop a']
@@ -0,0 +1,62 @@
+import time
+from unittest import mock
+
+import pytest
+
+import socket_hub
+from socket_hub import SocketHub, snap_rate
+
+
+class RecordingSocketIO:
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, data, to=None, namespace=None):
+        self.sent.append((event, to, bytes(data.json_bytes)))
+
+
+@pytest.fixture
+def hub():
+    with mock.patch.object(socket_hub, 'join_room'), mock.patch.object(socket_hub, 'leave_room'):
+        yield SocketHub(RecordingSocketIO())
+
+
+def test_snap_rate_coerces_and_validates():
+    assert snap_rate(None) is None
+    assert snap_rate('5') == 2
+    assert snap_rate(0.05) == 0.1
+    for bad in ('fast', True, -1, [1]):
+        with pytest.raises(ValueError):
+            snap_rate(bad)
+
+
+@pytest.mark.parametrize('data', [None, 'telemetry', [1], {'channel': 1},
+                                  {'channel': 'device:toaster'},
+                                  {'channel': 'alerts', 'format': ['json']}])
+def test_subscribe_request_rejects_bad_payloads(hub, data):
+    with pytest.raises(ValueError):
+        hub.subscribe_request('sid', data)
+
+
+def test_subscribe_request_joins_rate_room(hub):
+    room = hub.subscribe_request('sid', {'channel': 'device:plant', 'max_hz': '5'})
+    assert room == 'device:plant@2hz'
+    assert hub.subscriptions('sid') == {'device:plant': room}
+
+
+def test_throttled_room_gets_trailing_emit(hub):
+    hub.subscribe('sid', 'device:area1', max_hz=10)
+    for value in ('ON', 'OFF', 'ON', 'OFF'):
+        hub.publish('device:area1', 'device_update', {'area1': value})
+
+    sent = hub.socketio.sent
+    assert [payload for _, _, payload in sent] == [b'{"area1":"ON"}']
+    time.sleep(0.2)
+    assert [payload for _, _, payload in sent] == [b'{"area1":"ON"}', b'{"area1":"OFF"}']
+
+
+def test_unthrottled_publish_reaches_every_room_once(hub):
+    hub.subscribe('a', 'telemetry', max_hz=1)
+    hub.subscribe('b', 'telemetry')
+    hub.publish('telemetry', 'state_update', {'x': 1})
+    assert hub.publish('telemetry', 'mqtt_status', {'connected': True}, throttle=False) == 2
@@ -0,0 +1,44 @@
+import os
+import time
+
+from state_store import StateStore
+
+
+def make_store(directory, state):
+    def apply(restored):
+        for section, values in restored.items():
+            state.setdefault(section, {}).update(values)
+    return StateStore(str(directory), lambda: {k: dict(v) for k, v in state.items()}, apply,
+                      flush_interval=0.01)
+
+
+def test_clean_stop_restores_exact_state(tmp_path):
+    state = {'system_state': {'calculated_bill': 1.5, 'area1': 'ON'}}
+    store = make_store(tmp_path, state)
+    store.start()
+    state['system_state']['calculated_bill'] = 2.75
+    store.stop()
+
+    restored = {}
+    assert make_store(tmp_path, restored).restore()
+    assert restored == {'system_state': {'calculated_bill': 2.75, 'area1': 'ON'}}
+
+
+def test_journal_replay_ignores_torn_tail(tmp_path):
+    state = {'system_state': {'calculated_bill': 0.0}}
+    store = make_store(tmp_path, state)
+    store.start()
+    for value in (1.0, 2.0, 3.0):
+        state['system_state']['calculated_bill'] = value
+        time.sleep(0.05)
+    store._stop.set()                    # simulate a crash: no final snapshot
+    store._thread.join()
+
+    with open(os.path.join(tmp_path, 'state.journal'), 'ab') as f:
+        f.write(b'\x40\x00\x00\x00garbage')
+
+    restored = {}
+    fresh = make_store(tmp_path, restored)
+    assert fresh.restore()
+    assert restored['system_state']['calculated_bill'] == 3.0
+    assert fresh.stats['restored_records'] >= 1
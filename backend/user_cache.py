@@ -0,0 +1,65 @@
+"""
+User / Role Cache
+Keeps the fields authenticated endpoints need in memory so session
+validation is a dict lookup instead of a database query.
+"""
+
+import threading
+
+_MISSING = object()
+
+
+class UserCache:
+    """
+    user_id → {'id', 'username', 'role', 'full_name'} (or None for users
+    that do not exist). Entries are loaded on first use and dropped by
+    `invalidate()` whenever a user row changes. A load that overlaps an
+    invalidation is returned but not cached, so a stale row read just
+    before a commit cannot outlive it.
+    """
+
+    def __init__(self, load_user):
+        self.load_user = load_user
+        self._users = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @staticmethod
+    def to_entry(user):
+        if user is None:
+            return None
+        return {
+            'id': user.id,
+            'username': user.username,
+            'role': user.role,
+            'full_name': user.full_name,
+        }
+
+    def get(self, user_id):
+        entry = self._users.get(user_id, _MISSING)
+        if entry is not _MISSING:
+            self.stats['hits'] += 1
+            return entry
+
+        self.stats['misses'] += 1
+        generation = self._generation
+        entry = self.to_entry(self.load_user(user_id))
+        with self._lock:
+            if generation == self._generation:
+                self._users[user_id] = entry
+        return entry
+
+    def prime(self, users):
+        with self._lock:
+            for user in users:
+                self._users[user.id] = self.to_entry(user)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._users.clear()
+            else:
+                self._users.pop(user_id, None)
+            self._generation += 1
+            self.stats['invalidations'] += 1
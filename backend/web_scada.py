@@ -2,22 +2,55 @@
 Smart Grid SCADA Backend Server
 Digital Twin Simulation + Real MQTT Hardware Override
 Run with: python web_scada.py
+
+Embed or test with `create_app(config)`; background services (simulator,
+MQTT bridge, telemetry, Wazuh poller, DB seeding, state persistence) are
+enabled per app via SCADA_SERVICES and start lazily on first use.
+
+Per-app: services and their worker threads, the state store, static
+assets and the user cache (it mirrors the app's database). Process-wide:
+the grid/security state, energy account, forecaster, incident correlator,
+control pipeline, Socket.IO hub and MQTT bridge. They model the one
+physical grid this process is attached to, and Flask-SocketIO serves a
+single app at a time, so run one live app per process. Tests can build
+one app per test; they share that runtime state.
 """
 
 import os
+import atexit
 import json
 import math
 import random
 import threading
 import time
-from datetime import datetime, timedelta
+import weakref
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 
-from flask import Flask, request, jsonify, redirect, url_for, session, send_from_directory
+from flask import (
+    Blueprint, Flask, Response, current_app, g, has_app_context, request, jsonify, redirect,
+    url_for, session,
+)
 from flask_socketio import SocketIO, emit
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from load_profile import LoadProfile, DEFAULT_FEEDER
+from forecasting import LoadForecaster
+from alert_correlation import AlertCorrelator, extract_entity
+from control_pipeline import CommandPipeline
+from energy_accounting import EnergyAccount, TariffSchedule, area_readings, bill_period
+from services import ServiceRegistry
+from socket_hub import SocketHub
+from state_store import StateStore
+from static_assets import StaticAssets
+from user_cache import UserCache
+from state_codec import (
+    FORMAT_JSON, MSGPACK_AVAILABLE, MSGPACK_MIMETYPE, SnapshotCache, SocketJSON,
+)
+
 try:
     import paho.mqtt.client as mqtt
     MQTT_AVAILABLE = True
@@ -26,21 +59,16 @@ except ImportError:
     print("⚠️  paho-mqtt not installed. Run: pip install paho-mqtt")
 
 # ─────────────────────────────────────────────────────────────
-# Flask App Configuration
+# Extensions (bound to an app in create_app)
 # ─────────────────────────────────────────────────────────────
-app = Flask(__name__, static_folder='dist', static_url_path='')
-_secret = os.environ.get('SECRET_KEY')
-if not _secret:
-    if os.environ.get('FLASK_ENV') == 'production':
-        raise RuntimeError("SECRET_KEY env var must be set in production")
-    _secret = 'dev-only-insecure-key'
-app.config['SECRET_KEY'] = _secret
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///scada.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+db = SQLAlchemy()
+socketio = SocketIO(json=SocketJSON)
+bp = Blueprint('scada', __name__)
 state_lock = threading.Lock()
+hub = SocketHub(socketio)
+
+# Channels a client joins when it does not ask for any (keeps old clients working)
+DEFAULT_CHANNELS = ('telemetry',)
 
 # ─────────────────────────────────────────────────────────────
 # MQTT Configuration
@@ -67,6 +95,47 @@ class User(db.Model):
         return check_password_hash(self.password_hash, password)
 
 
+# Session validation reads users from each app's cache; committed writes to a user row evict it
+def _load_user(user_id):
+    return db.session.get(User, user_id)
+
+
+def user_cache():
+    return scada_ext()['user_cache']
+
+
+_DIRTY_USERS_KEY = 'scada_dirty_users'
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_dirty_users(session, flush_context):
+    """
+    Remember users written by this flush; they are evicted only once the
+    transaction commits, so a concurrent reader cannot re-cache the old row.
+    Bulk `query.update()` / `query.delete()` skip the unit of work and are
+    not seen here: call `user_cache().invalidate()` after using them on User.
+    """
+    ids = {obj.id for obj in (*session.new, *session.dirty, *session.deleted)
+           if isinstance(obj, User)}
+    if ids:
+        session.info.setdefault(_DIRTY_USERS_KEY, set()).update(ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    user_ids = session.info.pop(_DIRTY_USERS_KEY, ())
+    # Flask-SQLAlchemy sessions are scoped to the app context that committed
+    if user_ids and has_app_context() and 'scada' in current_app.extensions:
+        cache = user_cache()
+        for user_id in user_ids:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_dirty_users(session):
+    session.info.pop(_DIRTY_USERS_KEY, None)
+
+
 class GridData(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
@@ -157,32 +226,74 @@ _active_event = None
 _event_end_time = 0
 
 
+# ─────────────────────────────────────────────────────────────
+# Energy Accounting (trapezoidal integration + time-of-use tariff)
+# ─────────────────────────────────────────────────────────────
+TARIFF_PATH = os.environ.get('TARIFF_PATH')
+BILLING_MAX_GAP_SECONDS = 300   # GridData is sampled ~every 20 s
+
+tariff = TariffSchedule.load(TARIFF_PATH)
+energy_account = EnergyAccount(tariff)
+
+
+# ─────────────────────────────────────────────────────────────
+# Runtime State Persistence (snapshot + journal)
+# ─────────────────────────────────────────────────────────────
+# Values that cannot be recomputed from telemetry and must survive restarts
+PERSISTED_STATE_KEYS = (
+    'calculated_bill', 'attack_score', 'security_level', 'system_locked',
+    'area1', 'area2', 'price_rate',
+)
+
+
+def capture_runtime_state():
+    with state_lock:
+        return {
+            'system_state': {k: system_state[k] for k in PERSISTED_STATE_KEYS},
+            'security_stats': dict(security_stats),
+            'energy': energy_account.snapshot(),
+        }
+
+
+def restore_runtime_state(state):
+    with state_lock:
+        system_state.update({k: v for k, v in state.get('system_state', {}).items()
+                             if k in PERSISTED_STATE_KEYS})
+        security_stats.update({k: v for k, v in state.get('security_stats', {}).items()
+                               if k in security_stats})
+    energy_account.restore(state.get('energy', {}))
+
+
 # ─────────────────────────────────────────────────────────────
 # Daily Load Curve Model
 # ─────────────────────────────────────────────────────────────
-def get_base_load_for_hour(hour):
-    """Return base load (W) following a realistic daily demand curve."""
-    # Piecewise linear interpolation between time-of-day anchor points
-    curve = [
-        (0, 2000), (6, 2000),      # night: low
-        (7, 2800), (9, 3800),      # morning ramp
-        (12, 4000),                # late morning
-        (13, 5500), (17, 5500),    # afternoon plateau
-        (18, 6500), (20, 8000),    # evening peak ramp
-        (21, 8000),                # peak
-        (22, 5500), (23, 3500),    # evening wind-down
-        (24, 2000),                # back to night
-    ]
-    # Find surrounding anchor points
-    for i in range(len(curve) - 1):
-        t0, v0 = curve[i]
-        t1, v1 = curve[i + 1]
-        if t0 <= hour <= t1:
-            if t1 == t0:
-                return v0
-            frac = (hour - t0) / (t1 - t0)
-            return v0 + frac * (v1 - v0)
-    return 2000  # fallback
+LOAD_PROFILE_PATH = os.environ.get('LOAD_PROFILE_PATH')
+SIM_FEEDER = os.environ.get('SIM_FEEDER', DEFAULT_FEEDER)
+
+# Compiled once into dense per-minute tables (see load_profile.py)
+load_profile = LoadProfile.load(LOAD_PROFILE_PATH)
+
+
+# ─────────────────────────────────────────────────────────────
+# Load Forecasting (fitted incrementally, refit on a schedule)
+# ─────────────────────────────────────────────────────────────
+FORECAST_REFIT_SECONDS = int(os.environ.get('FORECAST_REFIT_SECONDS', 60))
+FORECAST_WARM_START_DAYS = 7
+
+forecaster = LoadForecaster(load_profile, SIM_FEEDER, refit_interval=FORECAST_REFIT_SECONDS)
+
+
+def warm_start_forecaster():
+    """Seed the forecaster from recent GridData so it is useful right after restart."""
+    since = datetime.utcnow() - timedelta(days=FORECAST_WARM_START_DAYS)
+    rows = db.session.query(
+        GridData.timestamp, GridData.load_mw, GridData.gen_mw
+    ).filter(GridData.timestamp >= since).order_by(GridData.timestamp.asc()).all()
+    forecaster.warm_start(
+        (ts.replace(tzinfo=timezone.utc).timestamp(), load, gen) for ts, load, gen in rows
+    )
+    forecaster.refit()
+    return len(rows)
 
 
 def simulate_grid_values():
@@ -193,10 +304,9 @@ def simulate_grid_values():
     global _active_event, _event_end_time
 
     now = datetime.now()
-    hour = now.hour + now.minute / 60.0
 
-    # --- Base load from daily curve ---
-    base_load = get_base_load_for_hour(hour)
+    # --- Base load from daily curve (feeder/season/day-type aware) ---
+    base_load = load_profile.evaluate_at(now, SIM_FEEDER)
 
     # --- Step-based fluctuation (mimics smart meter integer steps) ---
     step = random.choice([-500, 0, 500])
@@ -307,6 +417,27 @@ def merged_state():
     return state
 
 
+# Each distinct snapshot is encoded once and shared by REST and Socket.IO
+state_cache = SnapshotCache()
+
+
+def encoded_state():
+    """Return the merged state as a cached PreEncoded snapshot."""
+    return state_cache.get(merged_state())
+
+
+def encoded_response(payload):
+    """Serve pre-encoded bytes as JSON, or MessagePack when the client prefers it."""
+    best = request.accept_mimetypes.best_match(['application/json', MSGPACK_MIMETYPE])
+    if MSGPACK_AVAILABLE and best == MSGPACK_MIMETYPE:
+        response = Response(payload.msgpack_bytes, mimetype=MSGPACK_MIMETYPE)
+    else:
+        response = Response(payload.json_bytes, mimetype='application/json')
+    # Representation depends on Accept; keep shared caches from mixing them up
+    response.vary.add('Accept')
+    return response
+
+
 # ─────────────────────────────────────────────────────────────
 # MQTT Callbacks (real hardware data)
 # ─────────────────────────────────────────────────────────────
@@ -314,23 +445,26 @@ def on_mqtt_connect(client, userdata, flags, rc):
     print(f"✅ Connected to MQTT Broker (RC: {rc})")
     client.subscribe(TOPIC_ROOT)
     system_state['mqtt_connected'] = True
-    socketio.emit('mqtt_status', {'connected': True})
+    hub.publish('telemetry', 'mqtt_status', {'connected': True}, throttle=False)
 
 
 def on_mqtt_disconnect(client, userdata, rc):
     print(f"❌ MQTT Disconnected (RC: {rc})")
     system_state['mqtt_connected'] = False
-    socketio.emit('mqtt_status', {'connected': False})
+    hub.publish('telemetry', 'mqtt_status', {'connected': False}, throttle=False)
 
 
 def on_mqtt_message(client, userdata, msg):
     try:
         payload = msg.payload.decode()
         data = json.loads(payload)
-        hardware_state['last_message_time'] = time.time()
+        received_at = time.time()
+        hardware_state['last_message_time'] = received_at
         hardware_state['online'] = True
 
+        devices = []
         if "plant" in msg.topic:
+            devices.append('plant')
             hardware_state['gen_w'] = int(data.get('gen', 0))
             hardware_state['rpm'] = int(data.get('rpm', 0))
             hardware_state['status'] = data.get('status', 'online')
@@ -340,22 +474,36 @@ def on_mqtt_message(client, userdata, msg):
                 hardware_state['frequency'] = float(data['frequency'])
 
         elif "meter/data" in msg.topic:
+            devices.append('meter')
             hardware_state['load_w'] = int(data.get('load', 0))
 
         elif "grid/control" in msg.topic:
+            control_pipeline.on_echo(data)
             if 'area1' in data:
+                devices.append('area1')
                 hardware_state['area1'] = data['area1']
                 system_state['area1'] = data['area1']
             if 'area2' in data:
+                devices.append('area2')
                 hardware_state['area2'] = data['area2']
                 system_state['area2'] = data['area2']
 
         elif "meter/bill" in msg.topic:
+            devices.append('meter')
             if 'bill' in data:
                 system_state['calculated_bill'] = float(data['bill'])
 
+        # Meter readings and area switches change metered power: bill at arrival time
+        if {'meter', 'area1', 'area2'} & set(devices):
+            bill_sample(received_at, merged_state())
+
+        # Per-device feeds for clients watching a single device
+        for device in devices:
+            hub.publish(f'device:{device}', 'device_update',
+                        {'device': device, 'topic': msg.topic, 'data': data})
+
         # Broadcast merged state immediately on hardware data
-        socketio.emit('state_update', merged_state())
+        hub.publish('telemetry', 'state_update', encoded_state())
 
     except Exception as e:
         print(f"⚠️ MQTT parse error: {e}")
@@ -365,10 +513,20 @@ def on_mqtt_message(client, userdata, msg):
 # Authentication Helpers
 # ─────────────────────────────────────────────────────────────
 def login_required(f):
+    """Require a session whose user still exists; keeps the session role current."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
             return jsonify({'error': 'Unauthorized'}), 401
+
+        user = user_cache().get(session['user_id'])
+        if user is None or user['username'] != session.get('username'):
+            session.clear()
+            return jsonify({'error': 'Unauthorized'}), 401
+        if session.get('role') != user['role']:
+            session['role'] = user['role']
+
+        g.current_user = user
         return f(*args, **kwargs)
     return decorated_function
 
@@ -386,7 +544,7 @@ def add_audit_log(action, username, details=None):
 # ─────────────────────────────────────────────────────────────
 # Authentication Routes
 # ─────────────────────────────────────────────────────────────
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
 def login():
     username = request.form.get('username')
     password = request.form.get('password')
@@ -402,7 +560,7 @@ def login():
     return jsonify({'error': 'Invalid credentials'}), 401
 
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     username = session.get('username', 'unknown')
     add_audit_log('LOGOUT', username)
@@ -413,74 +571,132 @@ def logout():
 # ─────────────────────────────────────────────────────────────
 # API Routes (all use merged_state)
 # ─────────────────────────────────────────────────────────────
-@app.route('/api/state')
+@bp.route('/api/state')
 @login_required
 def get_state():
-    return jsonify(merged_state())
+    return encoded_response(encoded_state())
 
 
-@app.route('/api/me')
+@bp.route('/api/me')
 @login_required
 def me():
-    user = User.query.get(session['user_id'])
+    user = g.current_user
     return jsonify({
-        'username': session['username'],
-        'role': session['role'],
-        'full_name': user.full_name
+        'username': user['username'],
+        'role': user['role'],
+        'full_name': user['full_name']
     })
 
 
-@app.route('/api/control', methods=['POST'])
+@bp.route('/api/control', methods=['POST'])
 @login_required
 def control():
-    """Send control commands to hardware via MQTT."""
-    data = request.get_json()
+    """
+    Queue control commands for the hardware.
+
+    Toggles are resolved against the latest pending command for the area,
+    so rapid repeated toggles alternate instead of all reading stale state.
+    `set_areas` switches several areas in a single publish. Audit rows are
+    written by the pipeline worker, one commit per batch.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
     action = data.get('action')
+    username = session.get('username', 'unknown')
 
-    if action == 'toggle_area1':
-        with state_lock:
-            new_val = 'OFF' if system_state['area1'] == 'ON' else 'ON'
-        send_mqtt_control('area1', new_val)
-        add_audit_log('TOGGLE_AREA1', session.get('username', 'unknown'), {'new_state': new_val})
-        return jsonify({'success': True, 'area1': new_val})
+    origin = current_app._get_current_object()
+    try:
+        if action in ('toggle_area1', 'toggle_area2'):
+            cmd = control_pipeline.submit_toggle(action[len('toggle_'):], _current_area_state,
+                                                 username, origin)
+        elif action == 'set_areas':
+            cmd = control_pipeline.submit(data.get('areas'), username, origin=origin)
+        else:
+            return jsonify({'error': 'Unknown action'}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    elif action == 'toggle_area2':
-        with state_lock:
-            new_val = 'OFF' if system_state['area2'] == 'ON' else 'ON'
-        send_mqtt_control('area2', new_val)
-        add_audit_log('TOGGLE_AREA2', session.get('username', 'unknown'), {'new_state': new_val})
-        return jsonify({'success': True, 'area2': new_val})
+    return jsonify({'success': True, **cmd.areas, 'command_id': cmd.id, 'status': cmd.status})
 
-    return jsonify({'error': 'Unknown action'}), 400
 
+@bp.route('/api/control/<command_id>')
+@login_required
+def control_status(command_id):
+    cmd = control_pipeline.get(command_id)
+    if cmd is None:
+        return jsonify({'error': 'Unknown command'}), 404
+    return jsonify(cmd)
 
-def send_mqtt_control(area, value):
-    """Send control command to ESP32 via MQTT."""
-    global mqtt_client
+
+@bp.route('/api/v1/control/stats')
+@login_required
+def control_stats():
+    return jsonify(control_pipeline.stats())
+
+
+def _publish_control(payload):
+    """Publish one (possibly multi-area) control message to the ESP32."""
     if mqtt_client and system_state['mqtt_connected']:
-        payload = json.dumps({area: value})
-        mqtt_client.publish(TOPIC_CONTROL, payload, qos=1)
-        print(f"📤 MQTT Control: {area} → {value}")
-    else:
-        system_state[area] = value
-        socketio.emit('state_update', merged_state())
-        print(f"⚠️ MQTT offline, updated state locally: {area} → {value}")
+        mqtt_client.publish(TOPIC_CONTROL, json.dumps(payload), qos=1)
+        print(f"📤 MQTT Control [{payload.get('cmd_id')}]: "
+              f"{', '.join(f'{k} → {v}' for k, v in payload.items() if k in ('area1', 'area2'))}")
 
 
-@app.route('/api/v1/security-status')
-@login_required
-def get_security_status():
-    state = merged_state()
-    return jsonify({
+def _current_area_state(area):
+    with state_lock:
+        return system_state[area]
+
+
+def _audit_control_commands(commands):
+    """Write one audit row per command, one commit per originating app."""
+    by_app = {}
+    for cmd in commands:
+        if cmd.origin is not None:
+            by_app.setdefault(cmd.origin, []).append(cmd)
+    for app, cmds in by_app.items():
+        with app.app_context():
+            db.session.add_all(AuditLog(
+                action=cmd.action,
+                username=cmd.username,
+                details_json=json.dumps({'areas': cmd.areas, 'command_id': cmd.id}),
+            ) for cmd in cmds)
+            db.session.commit()
+
+
+def _apply_control_locally(areas):
+    with state_lock:
+        system_state.update(areas)
+    hub.publish('telemetry', 'state_update', encoded_state(), throttle=False)
+    print(f"⚠️ MQTT offline, updated state locally: {areas}")
+
+
+control_pipeline = CommandPipeline(
+    publish=_publish_control,
+    apply_local=_apply_control_locally,
+    is_online=lambda: bool(mqtt_client and system_state['mqtt_connected']),
+    audit=_audit_control_commands,
+)
+
+
+def security_snapshot(state=None):
+    state = state or merged_state()
+    return {
         'security_posture': state['security_level'],
         'attack_score': state['attack_score'],
-        'stats': security_stats,
+        'stats': dict(security_stats),
         'threat_intel': threat_intel,
         'timestamp': datetime.utcnow().isoformat(),
-    })
+    }
 
 
-@app.route('/api/v1/historical-data')
+@bp.route('/api/v1/security-status')
+@login_required
+def get_security_status():
+    return jsonify(security_snapshot())
+
+
+@bp.route('/api/v1/historical-data')
 @login_required
 def get_historical_data():
     start_str = request.args.get('start')
@@ -515,7 +731,63 @@ def get_historical_data():
     })
 
 
-@app.route('/api/get_logs')
+@bp.route('/api/v1/energy')
+@login_required
+def get_energy():
+    """Running energy/cost totals per meter and tariff band."""
+    return jsonify({
+        **energy_account.snapshot(),
+        'tariff': tariff.to_dict(),
+        'current_band': tariff.band_at(time.time()),
+    })
+
+
+@bp.route('/api/v1/billing')
+@login_required
+def get_billing():
+    """Recompute the bill for an arbitrary historical period from GridData."""
+    try:
+        start = datetime.fromisoformat(request.args['start'].replace('Z', '+00:00'))
+        end = datetime.fromisoformat(request.args['end'].replace('Z', '+00:00'))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'start and end (ISO-8601) are required'}), 400
+    start = start.astimezone(timezone.utc).replace(tzinfo=None) if start.tzinfo else start
+    end = end.astimezone(timezone.utc).replace(tzinfo=None) if end.tzinfo else end
+
+    rows = db.session.query(GridData.timestamp, GridData.load_mw).filter(
+        GridData.timestamp >= start,
+        GridData.timestamp <= end
+    ).order_by(GridData.timestamp.asc()).all()
+
+    epoch = datetime(1970, 1, 1)
+    timestamps = [(ts - epoch).total_seconds() for ts, _ in rows]
+    loads = [load or 0.0 for _, load in rows]
+    bill = bill_period(timestamps, loads, tariff, BILLING_MAX_GAP_SECONDS)
+
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'samples': len(rows),
+        **bill,
+    })
+
+
+@bp.route('/api/v1/forecast')
+@login_required
+def get_forecast():
+    """Serve the cached load/generation forecast for the requested horizon."""
+    try:
+        hours = float(request.args.get('horizon', 1))
+    except ValueError:
+        return jsonify({'error': 'Invalid horizon'}), 400
+
+    forecast = forecaster.forecast(hours)
+    if forecast is None:
+        return jsonify({'error': 'Forecast not ready'}), 503
+    return jsonify(forecast)
+
+
+@bp.route('/api/get_logs')
 @login_required
 def get_logs():
     log_type = request.args.get('type', 'threats')
@@ -589,6 +861,18 @@ WAZUH_PASS = os.environ.get('WAZUH_PASS', 'wazuh')
 # In-memory alert cache (populated by Wazuh or simulation)
 _cached_alerts = []
 
+# Raw alerts are folded into incidents keyed by (MITRE id, source entity)
+ALERT_WINDOW_SECONDS = int(os.environ.get('ALERT_WINDOW_SECONDS', 300))
+correlator = AlertCorrelator(window_seconds=ALERT_WINDOW_SECONDS)
+
+
+def correlate_alerts(alerts):
+    """Feed alerts to the correlator and push changed incidents to the alerts channel."""
+    changed = correlator.ingest(alerts)
+    if changed:
+        hub.publish('alerts', 'incident_update', changed, throttle=False)
+    return changed
+
 
 def fetch_wazuh_alerts():
     """Fetch alerts from Wazuh API. Falls back to simulated alerts on failure."""
@@ -624,8 +908,10 @@ def fetch_wazuh_alerts():
                     'mitre_name': mitre['name'],
                     'mitre_tactic': mitre['tactic'],
                     'source': 'wazuh',
+                    'source_entity': extract_entity(msg, item),
                 })
             _cached_alerts = alerts
+            correlate_alerts(alerts)
             return alerts
     except Exception as e:
         print(f"⚠️ Wazuh API unreachable ({e}), using simulated alerts")
@@ -669,10 +955,12 @@ def generate_simulated_alerts():
             'mitre_name': mitre['name'],
             'mitre_tactic': mitre['tactic'],
             'source': 'simulation',
+            'source_entity': extract_entity(t['message']),
         })
 
     alerts.sort(key=lambda a: a['timestamp'], reverse=True)
     _cached_alerts = alerts
+    correlate_alerts(alerts)
     return alerts
 
 
@@ -719,15 +1007,32 @@ def analyze_alert_with_ai(alert):
     }
 
 
-@app.route('/api/alerts')
+@bp.route('/api/alerts')
 @login_required
 def get_alerts():
-    """Fetch SOC alerts from Wazuh or simulated source."""
+    """Fetch SOC alerts from Wazuh or simulated source (cached when the poller runs)."""
+    if get_services().is_running('wazuh') and _cached_alerts:
+        return jsonify(_cached_alerts)
     alerts = fetch_wazuh_alerts()
     return jsonify(alerts)
 
 
-@app.route('/api/analyze-alert', methods=['POST'])
+@bp.route('/api/v1/incidents')
+@login_required
+def get_incidents():
+    """Correlated incidents (one per technique/source burst), newest first."""
+    try:
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    limit = max(1, min(limit, 1000))
+    return jsonify({
+        'incidents': correlator.incidents(limit, request.args.get('min_severity')),
+        'stats': correlator.snapshot_stats(),
+    })
+
+
+@bp.route('/api/analyze-alert', methods=['POST'])
 @login_required
 def analyze_alert():
     """Analyze a single alert with AI/heuristic engine."""
@@ -742,7 +1047,7 @@ def analyze_alert():
     return jsonify(result)
 
 
-@app.route('/api/get_stats')
+@bp.route('/api/get_stats')
 @login_required
 def get_stats():
     threat_counts = db.session.query(
@@ -767,89 +1072,175 @@ def get_stats():
 # ─────────────────────────────────────────────────────────────
 # Static File Serving (for production)
 # ─────────────────────────────────────────────────────────────
-@app.route('/')
-@app.route('/<path:path>')
+# The app's StaticAssets indexes the dist tree once; restart after redeploying the frontend
+@bp.route('/')
+@bp.route('/<path:path>')
 def serve_frontend(path=''):
-    if path and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
-    return send_from_directory(app.static_folder, 'index.html')
+    return scada_ext()['static_assets'].serve(path)
 
 
 # ─────────────────────────────────────────────────────────────
 # Socket.IO Events
 # ─────────────────────────────────────────────────────────────
+def _requested_channels(auth):
+    """Channels from the connect auth payload or ?channels=a,b query string."""
+    channels = None
+    if isinstance(auth, dict):
+        channels = auth.get('channels')
+    if channels is None and request.args.get('channels'):
+        channels = request.args.get('channels').split(',')
+    if channels is None:
+        return [{'channel': c} for c in DEFAULT_CHANNELS]
+    if isinstance(channels, str):
+        channels = channels.split(',')
+    if not isinstance(channels, (list, tuple)):
+        print(f"⚠️ Ignoring malformed channel list from {request.sid}")
+        return []
+    return [c if isinstance(c, dict) else {'channel': c} for c in channels]
+
+
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
+    ensure_services()
     print(f'Client connected: {request.sid}')
-    emit('mqtt_status', {'connected': system_state['mqtt_connected']})
-    emit('state_update', merged_state())
+    for sub in _requested_channels(auth):
+        try:
+            hub.subscribe_request(request.sid, sub)
+        except ValueError as e:
+            print(f"⚠️ Ignoring subscription from {request.sid}: {e}")
+
+    if 'telemetry' in hub.subscriptions(request.sid):
+        fmt = hub.format_for(request.sid, 'telemetry')
+        snapshot = encoded_state()
+        emit('mqtt_status', {'connected': system_state['mqtt_connected']})
+        emit('state_update', snapshot if fmt == FORMAT_JSON else snapshot.encoded(fmt))
+
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Join a channel room: {'channel': 'telemetry', 'max_hz': 1, 'format': 'msgpack'}."""
+    try:
+        room = hub.subscribe_request(request.sid, data)
+    except ValueError as e:
+        return {'ok': False, 'error': str(e)}
+    return {'ok': True, 'room': room}
+
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    channel = data.get('channel') if isinstance(data, dict) else None
+    room = hub.unsubscribe(request.sid, channel)
+    return {'ok': room is not None}
 
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    hub.drop(request.sid)
     print(f'Client disconnected: {request.sid}')
 
 
 # ─────────────────────────────────────────────────────────────
 # Simulation Loop (Digital Twin Engine)
 # ─────────────────────────────────────────────────────────────
-def simulation_loop():
+SIMULATION_INTERVAL_SECONDS = 2
+
+
+def simulation_loop(app, stop_event):
     """
-    Background thread that continuously updates simulated grid values.
-    Runs every 2 seconds. When hardware is online, simulation still runs
-    but merged_state() will prefer hardware values.
+    Background thread that produces simulated grid values every 2 seconds.
+    When hardware is online, simulation still runs but merged_state() will
+    prefer hardware values. Billing, history and broadcasts live in the
+    telemetry service, so they keep running without the simulator.
     """
-    with app.app_context():
-        while True:
-            # --- Update simulated grid values ---
-            sim = simulate_grid_values()
-            with state_lock:
-                system_state['gen_mw'] = sim['generation_w']
-                system_state['load_mw'] = sim['load_w']
-                system_state['voltage'] = sim['voltage']
-                system_state['frequency'] = sim['frequency']
-                system_state['gen_rpm'] = sim['rpm']
-                system_state['status'] = 'ONLINE'
-
-            # --- Billing: gradual accumulation ---
-            system_state['calculated_bill'] += sim['load_w'] * 0.000001
-
-            # --- Decay attack score ---
-            if system_state['attack_score'] > 0:
-                system_state['attack_score'] = max(0, system_state['attack_score'] - 0.5)
-
-            # --- Update security level ---
-            score = system_state['attack_score']
-            if score >= 70:
-                system_state['security_level'] = 'CRITICAL'
-            elif score >= 40:
-                system_state['security_level'] = 'WARNING'
-            else:
-                system_state['security_level'] = 'NORMAL'
-
-            # --- Record historical data (~every 20 seconds on average) ---
-            if random.random() < 0.1:
-                try:
-                    state = merged_state()
-                    grid_data = GridData(
-                        gen_mw=state['gen_mw'],
-                        load_mw=state['load_mw'],
-                        voltage=state['voltage'],
-                        frequency=state['frequency'],
-                        security_level=state['security_level'],
-                        attack_score=state['attack_score'],
-                    )
-                    db.session.add(grid_data)
-                    db.session.commit()
-                except Exception:
-                    db.session.rollback()
-
+    while not stop_event.is_set():
+        sim = simulate_grid_values()
+        with state_lock:
+            system_state['gen_mw'] = sim['generation_w']
+            system_state['load_mw'] = sim['load_w']
+            system_state['voltage'] = sim['voltage']
+            system_state['frequency'] = sim['frequency']
+            system_state['gen_rpm'] = sim['rpm']
+            system_state['status'] = 'ONLINE'
             security_stats['total_inspected'] += random.randint(1, 5)
 
-            # --- Broadcast merged state to all clients ---
-            socketio.emit('state_update', merged_state())
+        stop_event.wait(SIMULATION_INTERVAL_SECONDS)
+
+
+# ─────────────────────────────────────────────────────────────
+# Telemetry Loop (accounting, history, forecasting, broadcasts)
+# ─────────────────────────────────────────────────────────────
+TELEMETRY_INTERVAL_SECONDS = 2
+HISTORY_INTERVAL_SECONDS = 20
+
+
+def record_history(state):
+    try:
+        db.session.add(GridData(
+            gen_mw=state['gen_mw'],
+            load_mw=state['load_mw'],
+            voltage=state['voltage'],
+            frequency=state['frequency'],
+            security_level=state['security_level'],
+            attack_score=state['attack_score'],
+        ))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+
+
+def bill_sample(ts, state):
+    """Integrate the metered load in `state` up to `ts` and add its cost to the bill."""
+    cost = energy_account.sample(ts, area_readings(state['load_mw'], state))
+    with state_lock:
+        system_state['calculated_bill'] += cost
+
+
+def telemetry_tick(now_ts):
+    """One pass over the merged (hardware or simulated) state."""
+    # --- Billing: hardware readings are billed as they arrive (on_mqtt_message) ---
+    live = merged_state()
+    if live['data_source'] == 'simulation':
+        bill_sample(now_ts, live)
 
-            time.sleep(2)
+    with state_lock:
+        system_state['price_rate'] = tariff.rate_at(now_ts)
+
+        # --- Decay attack score and derive the security level ---
+        if system_state['attack_score'] > 0:
+            system_state['attack_score'] = max(0, system_state['attack_score'] - 0.5)
+        score = system_state['attack_score']
+        if score >= 70:
+            system_state['security_level'] = 'CRITICAL'
+        elif score >= 40:
+            system_state['security_level'] = 'WARNING'
+        else:
+            system_state['security_level'] = 'NORMAL'
+
+    snapshot = encoded_state()
+    state = snapshot.data
+
+    # --- Feed the forecaster; refit on its own schedule ---
+    forecaster.observe(now_ts, state['load_mw'], state['gen_mw'])
+    if forecaster.due(now_ts):
+        forecaster.refit(now_ts)
+
+    # --- Broadcast to subscribed rooms ---
+    hub.publish('telemetry', 'state_update', snapshot)
+    hub.publish('security', 'security_update', security_snapshot(state))
+    return state
+
+
+def telemetry_loop(app, stop_event):
+    """Background thread running telemetry_tick() every 2 seconds."""
+    next_history = 0.0
+    with app.app_context():
+        while not stop_event.is_set():
+            now_ts = time.time()
+            state = telemetry_tick(now_ts)
+            if now_ts >= next_history:
+                record_history(state)
+                next_history = now_ts + HISTORY_INTERVAL_SECONDS
+            stop_event.wait(TELEMETRY_INTERVAL_SECONDS)
 
 
 # ─────────────────────────────────────────────────────────────
@@ -877,39 +1268,234 @@ def init_db():
         db.session.add(operator)
 
     db.session.commit()
+    user_cache().prime(User.query.all())
 
 
 # ─────────────────────────────────────────────────────────────
-# Main Entry Point
+# Background Services
 # ─────────────────────────────────────────────────────────────
-if __name__ == '__main__':
-    with app.app_context():
-        init_db()
-        print("✅ Database initialized")
+ALL_SERVICES = ('db_seed', 'state_store', 'mqtt', 'simulator', 'telemetry', 'wazuh')
+WAZUH_POLL_SECONDS = int(os.environ.get('WAZUH_POLL_SECONDS', 30))
 
-    # Start MQTT connection to real hardware broker
-    if MQTT_AVAILABLE:
-        mqtt_client = mqtt.Client()
-        mqtt_client.on_connect = on_mqtt_connect
-        mqtt_client.on_disconnect = on_mqtt_disconnect
-        mqtt_client.on_message = on_mqtt_message
+def _start_db_seed(app):
+    init_db()
+    print("✅ Database initialized")
+    print(f"📈 Forecaster warmed from {warm_start_forecaster()} historical samples")
 
-        try:
-            mqtt_client.connect(BROKER, PORT, 60)
-            mqtt_client.loop_start()
-            print(f"🔌 Connecting to MQTT broker: {BROKER}:{PORT}")
-            print(f"📡 Subscribing to: {TOPIC_ROOT}")
-        except Exception as e:
-            print(f"⚠️ MQTT connection failed: {e}")
-            print("   Server will run without MQTT (simulation mode)")
-    else:
+
+def _start_state_store(app):
+    # Restore runtime counters before the simulator starts mutating them
+    store = scada_ext(app)['state_store']
+    if store.restore():
+        print(f"💾 Runtime state restored in {store.stats['restore_ms']} ms "
+              f"({store.stats['restored_records']} journal records)")
+    store.start()
+
+
+def _stop_state_store(app):
+    scada_ext(app)['state_store'].stop()
+
+
+def _start_mqtt(app):
+    """Start MQTT connection to real hardware broker."""
+    global mqtt_client
+    if not MQTT_AVAILABLE:
         print("⚠️ Running without MQTT (simulation-only mode)")
+        return
+
+    # One hardware bridge per process; remember which app opened it
+    mqtt_client = scada_ext(app)['mqtt_client'] = mqtt.Client()
+    mqtt_client.on_connect = on_mqtt_connect
+    mqtt_client.on_disconnect = on_mqtt_disconnect
+    mqtt_client.on_message = on_mqtt_message
+
+    try:
+        mqtt_client.connect(BROKER, PORT, 60)
+        mqtt_client.loop_start()
+        print(f"🔌 Connecting to MQTT broker: {BROKER}:{PORT}")
+        print(f"📡 Subscribing to: {TOPIC_ROOT}")
+    except Exception as e:
+        print(f"⚠️ MQTT connection failed: {e}")
+        print("   Server will run without MQTT (simulation mode)")
 
-    # Start simulation engine thread
-    sim_thread = threading.Thread(target=simulation_loop, daemon=True)
-    sim_thread.start()
+
+def _stop_mqtt(app):
+    global mqtt_client
+    client = scada_ext(app).pop('mqtt_client', None)
+    if client:
+        client.loop_stop()
+        client.disconnect()
+        if mqtt_client is client:
+            mqtt_client = None
+            system_state['mqtt_connected'] = False
+
+
+def _start_worker(app, name, target):
+    """Run `target(app, stop_event)` on a daemon thread owned by this app."""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=target, args=(app, stop_event), name=name, daemon=True)
+    scada_ext(app)['workers'][name] = (thread, stop_event)
+    thread.start()
+
+
+def _stop_worker(app, name, timeout):
+    worker = scada_ext(app)['workers'].pop(name, None)
+    if worker:
+        thread, stop_event = worker
+        stop_event.set()
+        thread.join(timeout=timeout)
+
+
+def _start_simulator(app):
+    _start_worker(app, 'simulator', simulation_loop)
     print("🔄 Digital Twin simulation engine started (2s interval)")
 
+
+def _stop_simulator(app):
+    _stop_worker(app, 'simulator', timeout=5)
+
+
+def _start_telemetry(app):
+    _start_worker(app, 'telemetry', telemetry_loop)
+    print(f"📊 Telemetry service started (billing, history, forecast; "
+          f"{TELEMETRY_INTERVAL_SECONDS}s interval)")
+
+
+def _stop_telemetry(app):
+    _stop_worker(app, 'telemetry', timeout=5)
+
+
+def wazuh_poll_loop(app, stop_event):
+    """Refresh the alert cache and incident correlator on a fixed interval."""
+    with app.app_context():
+        while not stop_event.is_set():
+            fetch_wazuh_alerts()
+            stop_event.wait(WAZUH_POLL_SECONDS)
+
+
+def _start_wazuh(app):
+    _start_worker(app, 'wazuh-poller', wazuh_poll_loop)
+    print(f"🛡️ Wazuh poller started ({WAZUH_POLL_SECONDS}s interval)")
+
+
+def _stop_wazuh(app):
+    _stop_worker(app, 'wazuh-poller', timeout=10)
+
+
+def scada_ext(app=None):
+    """Per-app runtime objects: services, state store, static assets, workers."""
+    return (app or current_app).extensions['scada']
+
+
+def get_services(app=None):
+    return scada_ext(app)['services']
+
+
+# Every registry created in this process, stopped once at interpreter exit
+_registries = weakref.WeakSet()
+
+
+@atexit.register
+def _stop_all_services():
+    for services in list(_registries):
+        services.stop_all()
+
+
+def ensure_services():
+    """Start enabled services on first use when the app is configured for lazy startup."""
+    if current_app.config['SCADA_LAZY_SERVICES']:
+        get_services().start_all()
+
+
+@bp.before_app_request
+def _lazy_start_services():
+    ensure_services()
+
+
+# ─────────────────────────────────────────────────────────────
+# App Factory
+# ─────────────────────────────────────────────────────────────
+def _services_from_env():
+    value = os.environ.get('SCADA_SERVICES')
+    if value is None:
+        return ALL_SERVICES
+    return tuple(s.strip() for s in value.split(',') if s.strip())
+
+
+def create_app(config=None):
+    """
+    Build the Flask app. Nothing heavy runs here: enabled services start on
+    the first request/socket connection (SCADA_LAZY_SERVICES) or when
+    `get_services(app).start_all()` is called.
+    """
+    app = Flask(__name__, static_folder=None)
+    app.config.update(
+        SECRET_KEY=os.environ.get('SECRET_KEY'),
+        SQLALCHEMY_DATABASE_URI='sqlite:///scada.db',
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SCADA_SERVICES=_services_from_env(),
+        SCADA_LAZY_SERVICES=True,
+        STATE_DIR=os.environ.get('STATE_DIR') or os.path.join(app.instance_path, 'state'),
+    )
+    app.config.update(config or {})
+
+    if not app.config['SECRET_KEY']:
+        if os.environ.get('FLASK_ENV') == 'production':
+            raise RuntimeError("SECRET_KEY env var must be set in production")
+        app.config['SECRET_KEY'] = 'dev-only-insecure-key'
+
+    unknown = set(app.config['SCADA_SERVICES']) - set(ALL_SERVICES)
+    if unknown:
+        raise ValueError(f"Unknown services: {', '.join(sorted(unknown))}")
+
+    db.init_app(app)
+    socketio.init_app(app, cors_allowed_origins="*", async_mode='threading')
+    app.register_blueprint(bp)
+
+    services = ServiceRegistry(app)
+    enabled = set(app.config['SCADA_SERVICES'])
+    services.register('db_seed', _start_db_seed, enabled='db_seed' in enabled)
+    services.register('state_store', _start_state_store, _stop_state_store,
+                      enabled='state_store' in enabled)
+    services.register('mqtt', _start_mqtt, _stop_mqtt, enabled='mqtt' in enabled)
+    services.register('simulator', _start_simulator, _stop_simulator,
+                      enabled='simulator' in enabled)
+    services.register('telemetry', _start_telemetry, _stop_telemetry,
+                      enabled='telemetry' in enabled)
+    services.register('wazuh', _start_wazuh, _stop_wazuh, enabled='wazuh' in enabled)
+    app.extensions['scada'] = {
+        'services': services,
+        'state_store': StateStore(app.config['STATE_DIR'],
+                                  capture_runtime_state, restore_runtime_state),
+        'static_assets': StaticAssets(os.path.join(app.root_path, 'dist')),
+        'user_cache': UserCache(_load_user),
+        'workers': {},   # name → (thread, stop event)
+    }
+    _registries.add(services)
+
+    return app
+
+
+_default_app = None
+
+
+def __getattr__(name):
+    """Build the default app on first access, for `web_scada:app` style imports."""
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ─────────────────────────────────────────────────────────────
+# Main Entry Point
+# ─────────────────────────────────────────────────────────────
+if __name__ == '__main__':
+    app = create_app()
+    get_services(app).start_all()
+
     print("\n🚀 Starting SCADA Server on http://localhost:5000")
     print("📋 Default credentials:")
     print("   Admin:    admin / admin123")